@@ -54,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'instrumentation.QueryTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,10 +155,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Django REST Framework authentication settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_RENDERER_CLASSES': ['rest_framework.renderers.JSONOpenAPIRenderer'],
+    # Reverse proxies in front of gunicorn (the platform router); the throttle 'ip' bucket
+    # takes the client address they appended to X-Forwarded-For, not one the client sent.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
+    # Buckets of throttles.SlidingWindowThrottle: '<throttle_scope>.<global|ip|email>'
+    'DEFAULT_THROTTLE_RATES': {
+        'send_code.global': os.getenv('THROTTLE_SEND_CODE_GLOBAL', '600/min'),
+        'send_code.ip': os.getenv('THROTTLE_SEND_CODE_IP', '10/min'),
+        'send_code.email': os.getenv('THROTTLE_SEND_CODE_EMAIL', '5/min'),
+        'verify_code.global': os.getenv('THROTTLE_VERIFY_CODE_GLOBAL', '1200/min'),
+        'verify_code.ip': os.getenv('THROTTLE_VERIFY_CODE_IP', '20/min'),
+        'verify_code.email': os.getenv('THROTTLE_VERIFY_CODE_EMAIL', '10/min'),
+    },
 }
 
 # Custom user model
@@ -169,21 +182,66 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),  # Lifetime of the Refresh Token
     'ROTATE_REFRESH_TOKENS': True,  # Issue a new refresh token each time it's used
     'BLACKLIST_AFTER_ROTATION': True,  # Blacklist the previous token after rotation
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.tokens.EpochTokenRefreshSerializer',  # Reject refresh tokens of a revoked epoch
 }
 
 
 # Email settings from environment variables
 
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'  # Use SMTP backend
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')  # Use SMTP backend
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
 EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  # Your email address from .env
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Your email password/app password from .env
+EMAIL_TIMEOUT = int(os.getenv('EMAIL_TIMEOUT', 10))  # Seconds before a stalled SMTP call fails and is retried
+EMAIL_RETRY_BACKOFF = int(os.getenv('EMAIL_RETRY_BACKOFF', 5))  # First retry delay in seconds, doubled on each retry
+
+# Cache (LocMem by default, point CACHE_BACKEND/CACHE_LOCATION at a shared backend in production)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+SHARED_CACHE = not CACHES['default']['BACKEND'].endswith('LocMemCache')  # Visible to every process
+
+# Anonymous catalog GETs (seconds, 0 disables; off unless the cache is shared, as edits are only seen by one process otherwise)
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300 if SHARED_CACHE else 0))
+# Min/max price of the product lists (seconds, 0 disables; off unless the cache is shared)
+PRICE_BOUNDS_TIMEOUT = int(os.getenv('PRICE_BOUNDS_TIMEOUT', 3600 if SHARED_CACHE else 0))
+
+# Share of requests measured by instrumentation.QueryTimingMiddleware (Server-Timing header + log line);
+# off unless set, e.g. 1.0 while profiling locally or 0.05 in production
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', 0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'instrumentation': {'handlers': ['console'], 'level': os.getenv('INSTRUMENTATION_LOG_LEVEL', 'INFO')},  # One JSON line per sampled request
+    },
+}
+
+# Login codes live in the cache when it is shared between processes, otherwise on UserCodeModel rows
+OTP_BACKEND = os.getenv('OTP_BACKEND') or ('accounts.otp.CacheOTPBackend' if SHARED_CACHE else 'accounts.otp.ModelOTPBackend')
+
+# Authenticated users cached for JWT requests (seconds, 0 disables; off unless the cache is shared)
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60 if SHARED_CACHE else 0))
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))  # Users kept in each process
+
+CART_RESERVATION_TTL = timedelta(minutes=int(os.getenv('CART_RESERVATION_MINUTES', 30)))  # Stock held by an untouched cart
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+AVATAR_SIZES = (64, 128, 400)  # Square avatar sizes written as JPEG + WebP by accounts.tasks.process_avatar
+PRODUCT_IMAGE_SIZES = {'thumbnail': 150, 'medium': 400, 'large': 800}  # Bounding boxes of product image derivatives
+
 
 SPECTACULAR_SETTINGS = {
     'TITLE': '🚀 Space Zone API',
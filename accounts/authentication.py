@@ -0,0 +1,39 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from . import user_cache
+from .tokens import check_token_epoch
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    simplejwt's JWTAuthentication, resolving the token's user through
+    `accounts.user_cache` instead of a query on every request. Saving a
+    user (or bulk-updating users) invalidates the cached copies, so the
+    token epoch check below always sees the current epoch.
+    """
+
+    def get_user(self, validated_token):
+        user = self.get_cached_user(validated_token)
+        check_token_epoch(validated_token, user)
+        return user
+
+    def get_cached_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not user_cache.is_enabled():
+            return super().get_user(validated_token)
+
+        user, version = user_cache.get_user(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set_user(user, version)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
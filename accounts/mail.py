@@ -0,0 +1,77 @@
+"""
+Outgoing mail over one long-lived connection per worker process.
+
+`get_connection()` is opened once and reused by every mail task the
+process runs, so an OTP costs one SMTP transaction instead of a TCP + TLS
+handshake and login. A connection the server dropped while idle is
+reopened and the failed message is sent again.
+"""
+import logging
+import smtplib
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the connection is thrown away and the send is retried.
+# Not bare OSError: SMTPException subclasses it, and a rejected login or
+# message (SMTPAuthenticationError, SMTPDataError) will not pass on a retry.
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError)
+
+_connection = None
+
+
+def get_mail_connection():
+    global _connection
+    if _connection is None:
+        _connection = get_connection(fail_silently=False)
+        _connection.open()
+    return _connection
+
+
+def reset_mail_connection():
+    global _connection
+    if _connection is not None:
+        try:
+            _connection.close()
+        except Exception:
+            pass
+    _connection = None
+
+
+def build_message(subject, message, recipient_list, connection=None):
+    return EmailMessage(
+        subject=subject,
+        body=message,
+        from_email=settings.EMAIL_HOST_USER,
+        to=recipient_list,
+        connection=connection,
+    )
+
+
+def deliver(messages):
+    """
+    Send `messages` (dicts of subject/message/recipient_list) over the
+    shared connection, one SMTP transaction each.
+
+    A connection error triggers one reconnect; if the message still fails,
+    the error is raised with `.unsent` holding that message and the ones
+    after it, so a retry does not send the earlier ones twice.
+    """
+    for index, data in enumerate(messages):
+        for attempt in range(2):
+            try:
+                connection = get_mail_connection()
+                connection.send_messages([build_message(connection=connection, **data)])
+                break
+            except smtplib.SMTPRecipientsRefused as exc:
+                # Retrying cannot fix a rejected address; do not hold up the rest.
+                logger.error('mail to %s refused: %s', data.get('recipient_list'), exc.recipients)
+                break
+            except CONNECTION_ERRORS as exc:
+                reset_mail_connection()
+                if attempt:
+                    exc.unsent = list(messages[index:])
+                    raise
+                logger.warning('mail connection lost (%s), reconnecting', exc)
+    return len(messages)
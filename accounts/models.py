@@ -1,13 +1,25 @@
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.db import models
+import os
 from django.utils import timezone
 from datetime import timedelta
-import secrets
 from django.conf import settings
-from django.contrib.auth.hashers import make_password, check_password
+from django.db.models import F, Q
+from .otp import CODE_TTL, MAX_ATTEMPTS, REQUEST_INTERVAL, codes_match, digest_code, generate_code
 
 
-class CustomUserManager(BaseUserManager):
+class CustomUserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        from .user_cache import invalidate_users_on_commit, is_enabled
+        if not is_enabled():
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_users_on_commit(*user_ids)
+        return rows
+
+
+class CustomUserManager(BaseUserManager.from_queryset(CustomUserQuerySet)):
     def create_user(self, email, password, **extra_fields):
         if not email:
             raise ValueError("Email must be set")
@@ -39,14 +51,49 @@ class CustomUserModel(AbstractBaseUser, PermissionsMixin):
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
+    token_epoch = models.PositiveIntegerField(default=0)
     objects = CustomUserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = []
 
+    class Meta:
+        indexes = [
+            # Admin panel user list, keyset pages and exports walk normal users by id.
+            models.Index(fields=['id'], condition=Q(is_superuser=False), name='user_regular_idx'),
+        ]
+
     def __str__(self):
         return f'{self.email}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'avatar' in fields:
+            self._loaded_avatar = self.avatar.name
+
+    def revoke_tokens(self):
+        """Invalidate every access and refresh token issued to this user so far."""
+        type(self).objects.filter(pk=self.pk).update(token_epoch=F('token_epoch') + 1)
+        self.refresh_from_db(fields=['token_epoch'])
+
+    def avatar_changed(self):
+        return self.avatar.name != getattr(self, '_loaded_avatar', None)
+
+    def get_avatar_variants(self):
+        if not self.avatar or os.path.basename(self.avatar.name) != 'avatar.jpg':
+            return None
+        base_url = self.avatar.url.rsplit('/', 1)[0]
+        return {
+            str(size): {'jpg': f'{base_url}/avatar_{size}.jpg', 'webp': f'{base_url}/avatar_{size}.webp'}
+            for size in settings.AVATAR_SIZES
+        }
+
     def has_perm(self,perm,obj=None):
         return True
 
@@ -61,8 +108,9 @@ class UserCodeModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField(default=timezone.now)
     is_used = models.BooleanField(default=False)
+    attempts = models.PositiveSmallIntegerField(default=0)
 
-    REQUEST_INTERVAL = timedelta(seconds=30)
+    REQUEST_INTERVAL = timedelta(seconds=REQUEST_INTERVAL)
 
     def seconds_until_next_code(self):
         if not self.created_at:
@@ -74,23 +122,14 @@ class UserCodeModel(models.Model):
         return timezone.now() >= self.created_at + self.REQUEST_INTERVAL
 
     def create_code(self):
-        if UserCodeModel.DoesNotExist:
-            raw_code  = str(secrets.randbelow(1000000)).zfill(6)
-            self.code = make_password(raw_code)
-            self.created_at = timezone.now()
-            self.expires_at = self.created_at + timedelta(minutes=5)
-            self.is_used = False
-            self.save()
-            return raw_code
-        if self.can_request_new():
-            raw_code  = str(secrets.randbelow(1000000)).zfill(6)
-            self.code = make_password(raw_code)
-            self.created_at = timezone.now()
-            self.expires_at = self.created_at + timedelta(minutes=5)
-            self.is_used = False
-            self.save()
-            return raw_code
-        return None
+        raw_code = generate_code()
+        self.code = digest_code(self.user_id, raw_code)
+        self.created_at = timezone.now()
+        self.expires_at = self.created_at + timedelta(seconds=CODE_TTL)
+        self.is_used = False
+        self.attempts = 0
+        self.save()
+        return raw_code
     def expires_code(self):
         if not self.created_at or not self.expires_at:
             return True
@@ -98,10 +137,13 @@ class UserCodeModel(models.Model):
     def verify_code(self,input_code):
         if self.is_used or self.expires_code():
             return False
-        if check_password(input_code,self.code):
-            self.is_used = True
-            self.save()
-            return True
-        return False
+        # Counted with a conditional UPDATE so parallel guesses cannot exceed the limit.
+        counted = UserCodeModel.objects.filter(pk=self.pk, is_used=False, attempts__lt=MAX_ATTEMPTS).update(attempts=F('attempts') + 1)
+        if not counted or not codes_match(self.user_id, input_code, self.code):
+            return False
+        # Only the request that flips is_used may use the code.
+        used = UserCodeModel.objects.filter(pk=self.pk, is_used=False).update(is_used=True)
+        self.is_used = True
+        return bool(used)
     def __str__(self):
         return self.user.email
@@ -0,0 +1,115 @@
+"""
+One-time login codes.
+
+A 6-digit code that lives for a few minutes does not need a slow password
+hash: it is stored as a keyed HMAC digest instead, and guessing is bounded
+by a per-code attempt limit. Two backends share the same interface:
+
+- `CacheOTPBackend` keeps digest, cooldown and attempts in Django's cache
+  (no DB writes; needs a cache shared by all processes).
+- `ModelOTPBackend` keeps them on `UserCodeModel` rows (the fallback).
+
+`settings.OTP_BACKEND` picks one; use `get_otp_backend()` to get it.
+"""
+import hashlib
+import hmac
+import secrets
+import time
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+CODE_TTL = 5 * 60
+REQUEST_INTERVAL = 30
+MAX_ATTEMPTS = 5
+
+_KEY = hashlib.sha256(b'accounts.otp:' + settings.SECRET_KEY.encode()).digest()
+
+
+def generate_code():
+    return str(secrets.randbelow(1000000)).zfill(6)
+
+
+def digest_code(user_id, code):
+    return hmac.new(_KEY, f'{user_id}:{code}'.encode(), hashlib.sha256).hexdigest()
+
+
+def codes_match(user_id, code, digest):
+    return hmac.compare_digest(digest_code(user_id, str(code)), digest or '')
+
+
+class CacheOTPBackend:
+    CODE_KEY = 'otp:code:{}'
+    ATTEMPTS_KEY = 'otp:attempts:{}'
+    COOLDOWN_KEY = 'otp:cooldown:{}'
+
+    def seconds_until_next_code(self, user):
+        issued_at = cache.get(self.COOLDOWN_KEY.format(user.pk))
+        if issued_at is None:
+            return 0
+        return max(0, int(issued_at + REQUEST_INTERVAL - time.time()))
+
+    def can_request_new(self, user):
+        return self.seconds_until_next_code(user) == 0
+
+    def create_code(self, user):
+        """Return a new code, or None while the previous one is in its cooldown."""
+        # add() is atomic, so two concurrent requests cannot both issue a code.
+        if not cache.add(self.COOLDOWN_KEY.format(user.pk), time.time(), REQUEST_INTERVAL):
+            return None
+        code = generate_code()
+        cache.set_many({
+            self.CODE_KEY.format(user.pk): digest_code(user.pk, code),
+            self.ATTEMPTS_KEY.format(user.pk): 0,
+        }, CODE_TTL)
+        return code
+
+    def verify_code(self, user, input_code):
+        code_key = self.CODE_KEY.format(user.pk)
+        digest = cache.get(code_key)
+        if digest is None:
+            return False
+        try:
+            attempts = cache.incr(self.ATTEMPTS_KEY.format(user.pk))
+        except ValueError:
+            attempts = MAX_ATTEMPTS + 1
+        if attempts > MAX_ATTEMPTS:
+            cache.delete(code_key)
+            return False
+        if not codes_match(user.pk, input_code, digest):
+            return False
+        # Only the request that actually removes the code may use it.
+        return bool(cache.delete(code_key))
+
+
+class ModelOTPBackend:
+    def _get(self, user):
+        from .models import UserCodeModel
+        return UserCodeModel.objects.get_or_create(user=user)[0]
+
+    def seconds_until_next_code(self, user):
+        return self._get(user).seconds_until_next_code()
+
+    def can_request_new(self, user):
+        return self._get(user).can_request_new()
+
+    def create_code(self, user):
+        user_code = self._get(user)
+        if user_code.code and not user_code.can_request_new():
+            return None
+        return user_code.create_code()
+
+    def verify_code(self, user, input_code):
+        from .models import UserCodeModel
+        user_code = UserCodeModel.objects.filter(user=user).first()
+        return bool(user_code and user_code.verify_code(input_code))
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+def get_otp_backend():
+    return _load_backend(getattr(settings, 'OTP_BACKEND', 'accounts.otp.CacheOTPBackend'))
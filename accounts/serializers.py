@@ -1,5 +1,6 @@
 from rest_framework import serializers
 from .models import CustomUserModel,UserCodeModel
+from .otp import get_otp_backend
 from password_strength import PasswordPolicy
 from rest_framework.exceptions import ValidationError
 from django.contrib.auth import authenticate
@@ -57,14 +58,18 @@ class LoginSerializer(serializers.ModelSerializer):
 
 
 class UserPanelSerializer(serializers.ModelSerializer):
+    avatar_variants = serializers.SerializerMethodField()
     class Meta:
         model = CustomUserModel
-        fields = ['id','email','first_name','last_name','avatar','national_code','phone_number','last_login','is_superuser']
+        fields = ['id','email','first_name','last_name','avatar','avatar_variants','national_code','phone_number','last_login','is_superuser']
         extra_kwargs = {'email':{'required':False},
                         'is_superuser': {'read_only':True},
                         'last_login':{'read_only':True}
                         }
 
+    def get_avatar_variants(self,obj):
+        return obj.get_avatar_variants()
+
 class UserCodeSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserCodeModel
@@ -75,7 +80,7 @@ class UserVerifyCodeSerializer(serializers.Serializer):
     code = serializers.CharField(required=True, write_only=True)
     def validate(self,data):
         user = CustomUserModel.objects.filter(email=data['email']).first()
-        if not user or not user.usercode.verify_code(data['code']):
+        if not user or not get_otp_backend().verify_code(user,data['code']):
             raise serializers.ValidationError("Invalid or expired code")
         return data
 
@@ -91,10 +96,11 @@ class SendCodeForgetUserSerializer(serializers.Serializer):
         return value
 
     def save(self):
-        if not self.user.usercode.can_request_new():
-            remaining = self.user.usercode.seconds_until_next_code()
+        otp = get_otp_backend()
+        code = otp.create_code(self.user)
+        if code is None:
+            remaining = otp.seconds_until_next_code(self.user)
             raise serializers.ValidationError(f"Cannot request code yet for {remaining}.")
-        code = self.user.usercode.create_code()
         return code
 
 class UpdatePasswordSerializer(serializers.ModelSerializer):
@@ -1,14 +1,76 @@
+import os
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
+from django.utils import timezone
+from .mail import CONNECTION_ERRORS, deliver
+from PIL import Image, ImageOps
+from images import save_image_atomic
+
+
+@shared_task(bind=True, max_retries=5)
+def send_verification_email(self, subject=None, message=None, recipient_list=None, messages=None):
+    """Send one mail over the shared connection (`messages` is only set by retries)."""
+    messages = messages or [{'subject': subject, 'message': message, 'recipient_list': recipient_list}]
+    try:
+        deliver(messages)
+    except CONNECTION_ERRORS as exc:
+        countdown = min(settings.EMAIL_RETRY_BACKOFF * 2 ** self.request.retries, 300)
+        raise self.retry(exc=exc, countdown=countdown, args=(), kwargs={'messages': getattr(exc, 'unsent', messages)})
+    return f"Email sent to {messages[0]['recipient_list']}"
+
 
 @shared_task
-def send_verification_email(subject, message, recipient_list):
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email=settings.EMAIL_HOST_USER,
-        recipient_list=recipient_list,
-        fail_silently=False,
-    )
-    return f"Email sent to {recipient_list}"
\ No newline at end of file
+def process_avatar(user_id, avatar_name):
+    """
+    Decode an uploaded avatar once and write every size in AVATAR_SIZES as
+    JPEG and WebP next to it (avatar_<size>.jpg/.webp, plus avatar.jpg at
+    the largest size). Files are written to a temp file and renamed into
+    place, and the user row is only repointed if the avatar was not
+    replaced in the meantime.
+    """
+    from .models import CustomUserModel
+
+    user = CustomUserModel.objects.filter(pk=user_id, avatar=avatar_name).first()
+    if user is None:
+        return "Avatar changed or user removed, skipped"
+
+    source_path = user.avatar.path
+    directory = os.path.dirname(source_path)
+    with Image.open(source_path) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    sizes = sorted(settings.AVATAR_SIZES)
+    for size in sizes:
+        resized = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        save_image_atomic(resized, os.path.join(directory, f"avatar_{size}.jpg"), format="JPEG", quality=75, optimize=True)
+        save_image_atomic(resized, os.path.join(directory, f"avatar_{size}.webp"), format="WEBP", quality=75, method=4)
+        if size == sizes[-1]:
+            save_image_atomic(resized, os.path.join(directory, "avatar.jpg"), format="JPEG", quality=75, optimize=True)
+
+    new_name = os.path.join(os.path.dirname(avatar_name), "avatar.jpg")
+    if new_name != avatar_name:
+        updated = CustomUserModel.objects.filter(pk=user_id, avatar=avatar_name).update(avatar=new_name)
+        if updated and os.path.exists(source_path):
+            os.remove(source_path)
+    return f"Avatar processed for user {user_id}"
+
+
+@shared_task
+def prune_expired_tokens(chunk_size=1000):
+    """
+    Delete outstanding refresh tokens (and their blacklist rows) that have
+    expired, `chunk_size` rows per statement so the tables are never locked
+    for long. An expired token is rejected on its `exp` claim alone.
+    """
+    from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+    now = timezone.now()
+    pruned = 0
+    while True:
+        ids = list(OutstandingToken.objects.filter(expires_at__lt=now).values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        BlacklistedToken.objects.filter(token_id__in=ids).delete()
+        OutstandingToken.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
+    return f"{pruned} expired tokens pruned"
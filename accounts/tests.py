@@ -1,3 +1,281 @@
-from django.test import TestCase
+import io
+import os
+import smtplib
+import tempfile
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+from PIL import Image
+from throttles import SlidingWindowThrottle, get_stats
+from . import mail, user_cache
+from .models import CustomUserModel, UserCodeModel
+from .otp import MAX_ATTEMPTS, CacheOTPBackend, ModelOTPBackend
+from .tasks import process_avatar
+from .tokens import EpochRefreshToken
 
-# Create your tests here.
+
+class UserCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_cache._local.clear()
+        self.user = CustomUserModel.objects.create_user('user@example.com', 'x')
+
+    @override_settings(USER_CACHE_TTL=60)
+    def test_bulk_update_invalidates_after_commit(self):
+        version = user_cache.get_version(self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            CustomUserModel.objects.filter(pk=self.user.pk).update(is_active=False)
+            self.assertEqual(user_cache.get_version(self.user.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(user_cache.get_version(self.user.pk), version)
+
+    @override_settings(USER_CACHE_TTL=60)
+    def test_save_invalidates_after_commit(self):
+        version = user_cache.get_version(self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = 'Ada'
+            self.user.save()
+            self.assertEqual(user_cache.get_version(self.user.pk), version)
+        self.assertNotEqual(user_cache.get_version(self.user.pk), version)
+
+    @override_settings(USER_CACHE_TTL=0)
+    def test_bulk_update_skips_the_cache_when_disabled(self):
+        with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+            CustomUserModel.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(callbacks, [])
+
+
+
+def throttle_rates(rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    @throttle_rates({'verify_code.ip': '2/min'})
+    def test_over_the_rate_is_429_with_retry_after(self):
+        for _ in range(2):
+            response = self.client.post('/api/auth/verify-code/', {'email': 'a@example.com', 'code': '000000'})
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/api/auth/verify-code/', {'email': 'a@example.com', 'code': '000000'})
+
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 120)
+        self.assertEqual(get_stats('verify_code'), {'allowed': 2, 'throttled': {'global': 0, 'ip': 1, 'email': 0}})
+
+    @throttle_rates({'verify_code.email': '1/min'})
+    def test_email_bucket_is_per_address(self):
+        self.client.post('/api/auth/verify-code/', {'email': 'a@example.com', 'code': '000000'})
+        response = self.client.post('/api/auth/verify-code/', {'email': 'A@example.com ', 'code': '000000'})
+        self.assertEqual(response.status_code, 429)
+        response = self.client.post('/api/auth/verify-code/', {'email': 'b@example.com', 'code': '000000'})
+        self.assertEqual(response.status_code, 400)
+
+    @throttle_rates({'verify_code.ip': '1/min'})
+    def test_ip_bucket_ignores_client_supplied_forwarded_for(self):
+        def post(forwarded_for):
+            return self.client.post('/api/auth/verify-code/', {'email': 'a@example.com', 'code': '000000'},
+                                    HTTP_X_FORWARDED_FOR=forwarded_for)
+
+        self.assertEqual(post('10.0.0.1, 203.0.113.7').status_code, 400)
+        self.assertEqual(post('10.0.0.2, 203.0.113.7').status_code, 429)
+        self.assertEqual(post('10.0.0.1, 203.0.113.8').status_code, 400)
+
+    def test_zero_rate_is_a_configuration_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SlidingWindowThrottle().parse_rate('0/min')
+
+
+@override_settings(USER_CACHE_TTL=0)
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(self.settings(MEDIA_ROOT=media.name))
+        self.user = CustomUserModel.objects.create_user('avatar@example.com', 'x')
+
+    def upload(self, name='face.png'):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 300), 'blue').save(buffer, format='PNG')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.avatar = SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+            self.user.save()
+        return callbacks
+
+    def test_writes_every_size_and_repoints_the_user(self):
+        self.upload()
+        source = self.user.avatar.path
+        process_avatar(self.user.pk, self.user.avatar.name)
+
+        self.user.refresh_from_db()
+        self.assertEqual(os.path.basename(self.user.avatar.name), 'avatar.jpg')
+        self.assertFalse(os.path.exists(source))
+        directory = os.path.dirname(self.user.avatar.path)
+        for size in settings.AVATAR_SIZES:
+            for extension in ('jpg', 'webp'):
+                with Image.open(os.path.join(directory, f'avatar_{size}.{extension}')) as image:
+                    self.assertEqual(image.size, (size, size))
+        self.assertEqual(set(self.user.get_avatar_variants()), {str(size) for size in settings.AVATAR_SIZES})
+
+    def test_skips_a_replaced_avatar(self):
+        self.upload()
+        stale = self.user.avatar.name
+        self.upload('other.png')
+        self.assertEqual(process_avatar(self.user.pk, stale), 'Avatar changed or user removed, skipped')
+
+    def test_only_avatar_changes_are_queued(self):
+        self.assertEqual(len(self.upload()), 1)
+        process_avatar(self.user.pk, self.user.avatar.name)
+        self.user.refresh_from_db()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.user.first_name = 'Ada'
+            self.user.save()
+        self.assertEqual(callbacks, [])
+
+
+class FlakyEmailBackend(EmailBackend):
+    """locmem backend whose sends raise the queued `failures` first."""
+    failures = []
+    opened = 0
+
+    def open(self):
+        type(self).opened += 1
+
+    def send_messages(self, messages):
+        if self.failures:
+            raise self.failures.pop(0)
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='accounts.tests.FlakyEmailBackend')
+class DeliverTests(TestCase):
+    def setUp(self):
+        mail.reset_mail_connection()
+        FlakyEmailBackend.opened = 0
+        self.addCleanup(mail.reset_mail_connection)
+        self.messages = [{'subject': f'Code {i}', 'message': 'x', 'recipient_list': ['to@example.com']} for i in range(2)]
+
+    def fail_with(self, *errors):
+        FlakyEmailBackend.failures = list(errors)
+        self.addCleanup(setattr, FlakyEmailBackend, 'failures', [])
+
+    def test_reuses_one_connection(self):
+        self.assertEqual(mail.deliver(self.messages), 2)
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+
+    def test_reconnects_once_after_a_drop(self):
+        self.fail_with(smtplib.SMTPServerDisconnected())
+        self.assertEqual(mail.deliver(self.messages), 2)
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+
+    def test_gives_up_after_the_second_drop(self):
+        self.fail_with(smtplib.SMTPServerDisconnected(), smtplib.SMTPServerDisconnected())
+        with self.assertRaises(smtplib.SMTPServerDisconnected) as raised:
+            mail.deliver(self.messages)
+        self.assertEqual(raised.exception.unsent, self.messages)
+        self.assertEqual(FlakyEmailBackend.opened, 2)
+
+    def test_rejected_login_is_not_retried(self):
+        self.fail_with(smtplib.SMTPAuthenticationError(535, b'bad credentials'))
+        with self.assertRaises(smtplib.SMTPAuthenticationError):
+            mail.deliver(self.messages)
+        self.assertEqual(FlakyEmailBackend.opened, 1)
+
+
+class OTPBackendTestsMixin:
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserModel.objects.create_user('otp@example.com', 'x')
+        self.otp = self.backend()
+
+    def wrong(self, code):
+        return str((int(code) + 1) % 1000000).zfill(6)
+
+    def test_code_is_used_only_once(self):
+        code = self.otp.create_code(self.user)
+        self.assertTrue(self.otp.verify_code(self.user, code))
+        self.assertFalse(self.otp.verify_code(self.user, code))
+
+    def test_attempts_are_limited(self):
+        code = self.otp.create_code(self.user)
+        for _ in range(MAX_ATTEMPTS):
+            self.assertFalse(self.otp.verify_code(self.user, self.wrong(code)))
+        self.assertFalse(self.otp.verify_code(self.user, code))
+
+    def test_new_code_waits_for_the_cooldown(self):
+        self.otp.create_code(self.user)
+        self.assertIsNone(self.otp.create_code(self.user))
+        self.assertGreater(self.otp.seconds_until_next_code(self.user), 0)
+
+
+class CacheOTPBackendTests(OTPBackendTestsMixin, TestCase):
+    backend = CacheOTPBackend
+
+    def test_code_is_not_stored_in_clear(self):
+        code = self.otp.create_code(self.user)
+        self.assertNotIn(code, cache.get(CacheOTPBackend.CODE_KEY.format(self.user.pk)))
+
+
+class ModelOTPBackendTests(OTPBackendTestsMixin, TestCase):
+    backend = ModelOTPBackend
+
+    def test_code_is_not_stored_in_clear(self):
+        code = self.otp.create_code(self.user)
+        self.assertNotIn(code, UserCodeModel.objects.get(user=self.user).code)
+
+
+@override_settings(OTP_BACKEND='accounts.otp.CacheOTPBackend')
+class VerifyCodeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserModel.objects.create_user('login@example.com', 'x')
+
+    def test_valid_code_returns_tokens_once(self):
+        code = CacheOTPBackend().create_code(self.user)
+        response = self.client.post('/api/auth/verify-code/', {'email': self.user.email, 'code': code})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), {'access', 'refresh'})
+
+        response = self.client.post('/api/auth/verify-code/', {'email': self.user.email, 'code': code})
+        self.assertEqual(response.status_code, 400)
+
+
+class TokenEpochTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserModel.objects.create_user('epoch@example.com', 'x')
+        self.refresh = EpochRefreshToken.for_user(self.user)
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_revoking_rejects_earlier_access_and_refresh_tokens(self):
+        self.authenticate(self.refresh.access_token)
+        self.assertEqual(self.client.get('/api/auth/panel/').status_code, 200)
+
+        self.user.revoke_tokens()
+
+        self.assertEqual(self.client.get('/api/auth/panel/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post('/api/refresh/', {'refresh': str(self.refresh)}).status_code, 401)
+
+    def test_tokens_issued_after_revoking_work(self):
+        self.user.revoke_tokens()
+        self.authenticate(EpochRefreshToken.for_user(self.user).access_token)
+        self.assertEqual(self.client.get('/api/auth/panel/').status_code, 200)
+
+    @override_settings(USER_CACHE_TTL=60)
+    def test_logout_all_revokes_through_the_user_cache(self):
+        self.authenticate(self.refresh.access_token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.get('/api/auth/panel/').status_code, 200)
+            self.assertEqual(self.client.post('/api/logout/all/').status_code, 200)
+        self.assertEqual(self.client.get('/api/auth/panel/').status_code, 401)
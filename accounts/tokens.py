@@ -0,0 +1,41 @@
+"""
+Token epochs: every token carries the user's `token_epoch` at issue time,
+and a token whose epoch is behind the user's current one is rejected.
+Revoking all of a user's tokens is a single counter bump
+(`CustomUserModel.revoke_tokens()` or a bulk `update()`), with no
+blacklist rows.
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+EPOCH_CLAIM = 'epoch'
+
+
+class EpochRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        # Copied into every access token derived from this refresh token.
+        token[EPOCH_CLAIM] = user.token_epoch
+        return token
+
+
+def check_token_epoch(token, user):
+    # Tokens issued before epochs existed count as epoch 0.
+    if token.get(EPOCH_CLAIM, 0) != user.token_epoch:
+        raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+
+
+class EpochTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = EpochRefreshToken
+
+    def validate(self, attrs):
+        from .models import CustomUserModel
+        refresh = self.token_class(attrs['refresh'])
+        user = CustomUserModel.objects.filter(**{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}).first()
+        if user is not None:
+            check_token_epoch(refresh, user)
+        return super().validate(attrs)
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import UserVerifyCodeView,UserSendCodeView,UserPanelView,SendCodeForgetUserView ,UpdatePasswordView,LogoutView
+from .views import UserVerifyCodeView,UserSendCodeView,UserPanelView,SendCodeForgetUserView ,UpdatePasswordView,LogoutView,LogoutAllView
 from rest_framework_simplejwt.views import TokenRefreshView
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
@@ -15,5 +15,6 @@ urlpatterns = [
     path('auth/forget/',SendCodeForgetUserView.as_view(),name='forget_password'),
     path('auth/forget/set/',UpdatePasswordView.as_view(),name='set_password'),
 
-    path('logout/',LogoutView.as_view(),name='logout')
+    path('logout/',LogoutView.as_view(),name='logout'),
+    path('logout/all/',LogoutAllView.as_view(),name='logout_all'),
 ]
@@ -0,0 +1,99 @@
+"""
+Authenticated users cached per process, validated against the shared cache.
+
+Every user has a version counter in Django's cache. A process-local LRU
+entry (and the pickled copy in the shared cache) is only used while it was
+stored under the current version, so bumping the counter with
+`invalidate_users()` retires every copy in every process at once. A lookup
+therefore costs one cache `get` instead of a `SELECT` on the user table.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+import cache_counters
+
+VERSION_KEY = 'auth:user:version:{}'
+USER_KEY = 'auth:user:{}:{}'
+
+
+class UserLRU:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, entry_version, expires_at = entry
+            if entry_version != version or expires_at < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, version, user, ttl):
+        with self.lock:
+            self.entries[user_id] = (user, version, time.monotonic() + ttl)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_local = UserLRU(getattr(settings, 'USER_CACHE_SIZE', 1024))
+
+
+def is_enabled():
+    return getattr(settings, 'USER_CACHE_TTL', 0) > 0
+
+
+def get_version(user_id):
+    return cache_counters.get_version(VERSION_KEY.format(user_id))
+
+
+def get_user(user_id):
+    """
+    Return `(user, version)`. `user` is a private copy or None on a miss; pass
+    `version` back to `set_user()` so a user loaded while it was being
+    invalidated is stored under the retired version and never served.
+    """
+    version = get_version(user_id)
+    user = _local.get(user_id, version)
+    if user is None:
+        user = cache.get(USER_KEY.format(user_id, version))
+        if user is None:
+            return None, version
+        _local.set(user_id, version, user, settings.USER_CACHE_TTL)
+    # Views mutate request.user, so never hand out the shared instance.
+    return copy.copy(user), version
+
+
+def set_user(user, version):
+    cache.set(USER_KEY.format(user.pk, version), user, settings.USER_CACHE_TTL)
+    _local.set(user.pk, version, copy.copy(user), settings.USER_CACHE_TTL)
+
+
+def invalidate_users(*user_ids):
+    for user_id in user_ids:
+        cache_counters.bump_version(VERSION_KEY.format(user_id))
+        _local.discard(user_id)
+
+
+def invalidate_users_on_commit(*user_ids):
+    """Retire the cached copies once the transaction changing the users commits."""
+    if user_ids and is_enabled():
+        transaction.on_commit(lambda: invalidate_users(*user_ids))
@@ -2,9 +2,12 @@ from rest_framework import viewsets, status
 from .serializers import RegisterSerializer, LoginSerializer, UserPanelSerializer, UserVerifyCodeSerializer ,SendCodeForgetUserSerializer ,UpdatePasswordSerializer
 from rest_framework.response import Response
 from permissions import IsNotAuth,IsNotSuperUser
+from throttles import SlidingWindowThrottle
 from rest_framework.views import APIView
-from .models import CustomUserModel, UserCodeModel
+from .models import CustomUserModel
+from .otp import get_otp_backend
 from rest_framework_simplejwt.tokens import RefreshToken
+from .tokens import EpochRefreshToken
 from rest_framework.permissions import IsAuthenticated
 from datetime import timedelta
 from django.core.mail import send_mail
@@ -25,6 +28,8 @@ class UserSendCodeView(APIView):
         - ❌ 401: Invalid credentials
     """
     permission_classes = [IsNotAuth]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'send_code'
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -38,71 +43,34 @@ class UserSendCodeView(APIView):
             ser_login = LoginSerializer(data=request.data)
             if ser_login.is_valid():
                 user = ser_login.validated_data['user']
-                try:
-                    user_code = UserCodeModel.objects.get(user=user)
-                except UserCodeModel.DoesNotExist:
-                    user_code = UserCodeModel.objects.create(user=user)
-                    if user_code.user.is_superuser == True:
-                        return Response({    "non_field_errors": [
-        "Invalid email or password"
-    ]},status=status.HTTP_401_UNAUTHORIZED)
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                if user_code.can_request_new():
-                    if user_code.user.is_superuser == True:
-                        return Response({    "non_field_errors": [
-        "Invalid email or password"
-    ]},status=status.HTTP_401_UNAUTHORIZED)
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                else:
-                    if user_code.user.is_superuser == True:
-                        return Response({"non_field_errors": [
-                            "Invalid email or password"
-                        ]}, status=status.HTTP_401_UNAUTHORIZED)
-                    remaining = user_code.seconds_until_next_code()
-                    return Response({"detail": f"Cannot request code yet for {remaining}."}, status=status.HTTP_400_BAD_REQUEST)
+                if user.is_superuser == True:
+                    return Response({"non_field_errors": [
+                        "Invalid email or password"
+                    ]}, status=status.HTTP_401_UNAUTHORIZED)
+                return self.send_code(user,email)
             else:
                 return Response(ser_login.errors, status=status.HTTP_401_UNAUTHORIZED)
         except CustomUserModel.DoesNotExist:
             ser_reg = RegisterSerializer(data=request.data)
             if ser_reg.is_valid():
                 user = ser_reg.save()
-                try:
-                    user_code = UserCodeModel.objects.get(user=user)
-                except UserCodeModel.DoesNotExist:
-                    user_code = UserCodeModel.objects.create(user=user)
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                if user_code.can_request_new():
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                else:
-                    remaining = user_code.seconds_until_next_code()
-                    return Response({"detail": f"Cannot request code yet for {remaining}."}, status=status.HTTP_400_BAD_REQUEST)
+                return self.send_code(user,email)
             else:
                 return Response(ser_reg.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def send_code(self,user,email):
+        otp = get_otp_backend()
+        code = otp.create_code(user)
+        if code is None:
+            remaining = otp.seconds_until_next_code(user)
+            return Response({"detail": f"Cannot request code yet for {remaining}."}, status=status.HTTP_400_BAD_REQUEST)
+        send_verification_email.delay(
+            subject="Verification-Code",
+            message=f"your auth code: {code}",
+            recipient_list=[email],
+        )
+        return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
+
 class UserVerifyCodeView(APIView):
     """
     Verifies a one-time **authentication code** and issues JWT tokens.
@@ -116,6 +84,8 @@ class UserVerifyCodeView(APIView):
         - ❌ 400: Invalid, used, or expired code
     """
     permission_classes = [IsNotAuth]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'verify_code'
     serializer_class = UserVerifyCodeSerializer
     def post(self, request):
         ser_data = UserVerifyCodeSerializer(data=request.data)
@@ -123,7 +93,7 @@ class UserVerifyCodeView(APIView):
             user = CustomUserModel.objects.get(email=ser_data.validated_data['email'])
             if user.is_superuser == True:
                 return Response({"detail":"HTTP_400_BAD_REQUEST"},status=status.HTTP_400_BAD_REQUEST)
-            refresh = RefreshToken.for_user(user)
+            refresh = EpochRefreshToken.for_user(user)
             access_token = refresh.access_token
             access_token.set_exp(lifetime=timedelta(minutes=15))
             return Response({"access": str(access_token),"refresh": str(refresh)},status=status.HTTP_200_OK)
@@ -183,6 +153,8 @@ class SendCodeForgetUserView(APIView):
         - ❌ 400: Invalid email or request too soon
     """
     permission_classes = [IsNotAuth]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'send_code'
     serializer_class = SendCodeForgetUserSerializer
     def post(self,request):
         ser_person = SendCodeForgetUserSerializer(data=request.data)
@@ -244,4 +216,19 @@ class LogoutView(APIView):
             return Response(
                 {"detail": "Your token is already blocked."},
                 status=status.HTTP_400_BAD_REQUEST
-            )
\ No newline at end of file
+            )
+
+class LogoutAllView(APIView):
+    """
+    Logs the user out on **every device**.
+
+    Bumps the user's token epoch, so all access and refresh tokens issued
+    so far stop working at once.
+
+    Responses:
+        - ✅ 200: All tokens revoked
+    """
+    permission_classes = [IsAuthenticated]
+    def post(self,request):
+        request.user.revoke_tokens()
+        return Response({"detail": "You are logout from all devices!"},status=status.HTTP_200_OK)
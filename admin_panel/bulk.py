@@ -0,0 +1,34 @@
+"""
+Bulk admin actions that run as one UPDATE.
+
+The affected-row count comes back from the UPDATE itself, so an action
+never runs `exists()` / `count()` over the same predicate first. Side
+effects that `save()` and the post_save receivers would have had are
+restated by the model querysets' `update()`: they touch `updated_at`,
+bump the response-cache versions and invalidate price bounds / cached users.
+"""
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from .serializers import BulkIdsSerializer
+
+
+class NothingToUpdate(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = 'No IDs provided'
+    default_code = 'nothing_to_update'
+
+
+class BulkActionMixin:
+    def get_bulk_ids(self, request):
+        if not request.data.get('ids'):
+            raise NothingToUpdate()
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['ids']
+
+    def bulk_response(self, rows, message):
+        """`message` is formatted with the row count; no row changed is a 400, as before."""
+        if not rows:
+            raise NothingToUpdate('No rows matched the given IDs')
+        return Response({"detail": message.format(count=rows), "count": rows}, status=status.HTTP_200_OK)
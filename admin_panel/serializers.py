@@ -0,0 +1,7 @@
+from rest_framework import serializers
+
+MAX_BULK_IDS = 10000
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_IDS)
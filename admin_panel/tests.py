@@ -1,3 +1,172 @@
-from django.test import TestCase
+import csv
+import io
+import json
+from django.core.cache import cache
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from accounts.models import CustomUserModel
+from orders.models import Order
+from product.models import Category, Product, ProductComment
+from .views import ProductInformationViewSet
 
-# Create your tests here.
+
+class AdminTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.admin = CustomUserModel.objects.create_superuser('admin@example.com', 'x')
+        self.client.force_authenticate(self.admin)
+        self.category = Category.objects.create(title='Tools')
+
+    def make_product(self, title, **kwargs):
+        kwargs.setdefault('exist_number', 5)
+        kwargs.setdefault('show_item', True)
+        kwargs.setdefault('category', self.category)
+        return Product.objects.create(title=title, description='d', price=10, **kwargs)
+
+
+class BulkActionTests(AdminTestMixin, APITestCase):
+    def test_bulk_update_sets_values_and_status_in_one_update(self):
+        hammer, saw = self.make_product('Hammer'), self.make_product('Saw', exist_number=0, status='pending')
+        untouched = self.make_product('Drill')
+
+        with self.assertNumQueries(1):
+            response = self.client.post('/api/admin/panel/product/bulk-update/',
+                                        {'ids': [hammer.id, saw.id], 'exist_number': 0, 'price': '12.00'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        products = Product.objects.in_bulk([hammer.id, saw.id, untouched.id])
+        self.assertEqual(products[hammer.id].status, 'unavailable')
+        self.assertEqual(products[saw.id].status, 'pending')
+        self.assertEqual(str(products[saw.id].price), '12.00')
+        self.assertEqual((products[untouched.id].exist_number, products[untouched.id].status), (5, 'available'))
+
+    def test_bulk_delete_reports_only_changed_rows(self):
+        hammer, saw = self.make_product('Hammer'), self.make_product('Saw', is_active=False)
+        response = self.client.post('/api/admin/panel/product/delete/', {'ids': [hammer.id, saw.id]}, format='json')
+        self.assertEqual(response.json()['count'], 1)
+
+        response = self.client.post('/api/admin/panel/product/delete/', {'ids': [saw.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'No rows matched the given IDs')
+
+    def test_bulk_action_without_ids_is_400(self):
+        response = self.client.post('/api/admin/panel/product/delete/', {'ids': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'No IDs provided')
+
+    def test_deactivating_users_revokes_their_tokens(self):
+        user = CustomUserModel.objects.create_user('user@example.com', 'x')
+        response = self.client.post('/api/admin/panel/users/user_delete/', {'ids': [user.id]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        self.assertEqual((user.is_active, user.token_epoch), (False, 1))
+
+
+class ProductEditTests(AdminTestMixin, APITestCase):
+    def test_patch_cannot_mark_image_variants_ready(self):
+        product = self.make_product('Hammer')
+        response = self.client.patch(f'/api/admin/panel/product/{product.slug}/',
+                                     {'description': 'Claw', 'image_variants_ready': True}, format='json')
+        self.assertEqual(response.status_code, 200)
+        product.refresh_from_db()
+        self.assertEqual((product.description, product.image_variants_ready), ('Claw', False))
+
+
+class ExportTests(AdminTestMixin, APITestCase):
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment;', response['Content-Disposition'])
+        return b''.join(response.streaming_content).decode()
+
+    def test_product_csv_export(self):
+        self.make_product('Hammer')
+        self.make_product('Saw', is_active=False)
+
+        rows = list(csv.DictReader(io.StringIO(self.read(self.client.get('/api/admin/panel/product/export/')))))
+
+        self.assertEqual([row['title'] for row in rows], ['Hammer', 'Saw'])
+        self.assertEqual((rows[0]['category'], rows[0]['price'], rows[1]['is_active']), ('tools', '10.00', 'False'))
+        self.assertRegex(rows[0]['created_at'], r'^\d{4}-\d{2}-\d{2}T')
+
+    def test_csv_cells_are_not_run_as_formulas(self):
+        link, saw = self.make_product('=HYPERLINK("http://example.com")'), self.make_product('Saw')
+        Product.objects.filter(pk=link.pk).update(description='-1+2')
+        Product.objects.filter(pk=saw.pk).update(description='@SUM(A1)')
+
+        body = self.read(self.client.get('/api/admin/panel/product/export/'))
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([(row['title'], row['description']) for row in rows],
+                         [('\'=HYPERLINK("http://example.com")', "'-1+2"), ('Saw', "'@SUM(A1)")])
+        self.assertEqual(rows[0]['price'], '10.00')
+
+        body = self.read(self.client.get('/api/admin/panel/product/export/', {'file_format': 'jsonl'}))
+        self.assertEqual(json.loads(body.splitlines()[0])['title'], '=HYPERLINK("http://example.com")')
+
+    def test_order_jsonl_export_filters_on_is_success(self):
+        user = CustomUserModel.objects.create_user('buyer@example.com', 'x')
+        Order.objects.create(user=user, is_success=True, tracking_code='done')
+        Order.objects.create(user=user)
+
+        body = self.read(self.client.get('/api/admin/panel/orders/export/', {'file_format': 'jsonl', 'is_success': 'true'}))
+
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([(row['user'], row['tracking_code']) for row in rows], [('buyer@example.com', 'done')])
+
+    def test_unknown_format_is_400(self):
+        response = self.client.get('/api/admin/panel/users/export/', {'file_format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTests(AdminTestMixin, APITestCase):
+    def upload(self, name, content, **data):
+        upload = SimpleUploadedFile(name, content.encode())
+        return self.client.post('/api/admin/panel/product/import/', {'file': upload, **data}, format='multipart')
+
+    def test_exported_csv_imports_back_as_updates(self):
+        self.make_product('Hammer')
+        exported = b''.join(self.client.get('/api/admin/panel/product/export/').streaming_content).decode()
+
+        response = self.upload('products.csv', exported.replace('Hammer', 'Claw hammer'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (0, 1))
+        self.assertEqual(Product.objects.get().title, 'Claw hammer')
+
+    def test_jsonl_rows_are_created_and_errors_reported(self):
+        lines = [
+            json.dumps({'title': 'Saw', 'description': 'd', 'price': '5', 'category': 'tools', 'exist_number': 2}),
+            'not json',
+        ]
+        response = self.upload('products.jsonl', '\n'.join(lines), batch_size=1)
+
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([error['row'] for error in response.json()['errors']], [2])
+
+    def test_unknown_format_is_400(self):
+        self.assertEqual(self.upload('products.xlsx', 'x').status_code, 400)
+
+
+class AdminProductListTests(AdminTestMixin, APITestCase):
+    def add_products(self, count):
+        for i in range(Product.objects.count(), Product.objects.count() + count):
+            category = Category.objects.create(title=f'Shelf {i}', parent=self.category)
+            product = self.make_product(f'Listed {i}', category=category, is_active=bool(i % 2))
+            ProductComment.objects.create(product=product, author=self.admin, text_comment='Nice')
+
+    def count_list_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/admin/panel/product/')
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list_queries_stay_within_budget_as_the_page_fills(self):
+        self.add_products(2)
+        few = self.count_list_queries()
+        self.add_products(8)
+        many = self.count_list_queries()
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, ProductInformationViewSet.query_budget['list'])
@@ -1,11 +1,12 @@
 from django.urls import path
-from .views import AdminSendCodeView,AdminPanelView,AdminVerifyCodeView,UserInformationViewSet,ProductInformationViewSet,AdminCategoryViewSet,AdminSelectCategoryViewSet
+from .views import AdminSendCodeView,AdminPanelView,AdminVerifyCodeView,UserInformationViewSet,ProductInformationViewSet,AdminCategoryViewSet,AdminSelectCategoryViewSet,AdminOrderExportView
 from rest_framework import routers
 
 urlpatterns = [
     path('admin/send-code/',AdminSendCodeView.as_view(),name='admin-send-code'),
     path('admin/verify-code/',AdminVerifyCodeView.as_view(),name='admin-verify-code'),
-    path('admin/panel/',AdminPanelView.as_view(),name='admin-panel')
+    path('admin/panel/',AdminPanelView.as_view(),name='admin-panel'),
+    path('admin/panel/orders/export/',AdminOrderExportView.as_view(),name='admin-order-export'),
 ]
 router_user = routers.SimpleRouter()
 router_user.register('admin/panel/users',UserInformationViewSet)
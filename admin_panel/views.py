@@ -2,23 +2,42 @@ from rest_framework import status,viewsets
 from accounts.serializers import LoginSerializer,UserPanelSerializer,UserVerifyCodeSerializer
 from rest_framework.response import Response
 from permissions import IsNotAuth,IsSuperUser
+from throttles import SlidingWindowThrottle
+from pagination import KeysetPagination
 from rest_framework.views import APIView
-from accounts.models import CustomUserModel, UserCodeModel
-from product.models import Product,Category
-from product.serializers import ProductCommentListSerializer,ProductSerializer,UserCategorySerializer,CategorySerializer
-from rest_framework_simplejwt.tokens import RefreshToken
+from accounts.models import CustomUserModel
+from accounts.otp import get_otp_backend
+from product.models import Product,Category,get_product_status_update
+from product.serializers import ProductCommentListSerializer,ProductSerializer,UserCategorySerializer,CategorySerializer,ProductBulkUpdateSerializer
+from product.loaders import load_category_tree,load_product_listing
+from product.fieldsets import ProductFieldset
+from product.price_stats import get_price_bounds
+from product.search import search_products
+from product.importer import IMPORT_FORMATS, ProductImporter, read_rows
+from orders.models import Order
+from exports import EXPORT_FORMATS, export_response
+from .bulk import BulkActionMixin
+from accounts.tokens import EpochRefreshToken
 from datetime import timedelta
 from django.core.paginator import Paginator
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
-from django.db.models import Min, Max
+from django.db.models import Q,F
 from django.core.mail import send_mail
 from django.conf import settings
 from accounts.tasks import send_verification_email
 
 # Create your views here.
 
+EXPORT_FORMAT_ERROR = {"detail": f"Unknown format, use one of: {', '.join(EXPORT_FORMATS)}"}
+
+def get_export_format(request):
+    file_format = request.query_params.get('file_format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return None
+    return file_format
+
 class AdminSendCodeView(APIView):
     """
     Sends a one-time **authentication code** to superusers for login.
@@ -34,6 +53,8 @@ class AdminSendCodeView(APIView):
         - ❌ 401: Invalid email, password, or user is not a superuser.
     """
     permission_classes = [IsNotAuth]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'send_code'
     serializer_class = LoginSerializer
 
     def post(self, request):
@@ -47,40 +68,21 @@ class AdminSendCodeView(APIView):
             ser_login = LoginSerializer(data=request.data)
             if ser_login.is_valid():
                 user = ser_login.validated_data['user']
-                try:
-                    user_code = UserCodeModel.objects.get(user=user)
-                except UserCodeModel.DoesNotExist:
-                    user_code = UserCodeModel.objects.create(user=user)
-                    if user_code.user.is_superuser == False:
-                        return Response({"non_field_errors": [
-                            "Invalid email or password"
-                        ]}, status=status.HTTP_401_UNAUTHORIZED)
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                if user_code.can_request_new():
-                    if user_code.user.is_superuser == False:
-                        return Response({"non_field_errors": [
-                            "Invalid email or password"
-                        ]}, status=status.HTTP_401_UNAUTHORIZED)
-                    code = user_code.create_code()
-                    send_verification_email.delay(
-                        subject="Verification-Code",
-                        message=f"your auth code: {code}",
-                        recipient_list=[email],
-                    )
-                    return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
-                else:
-                    if user_code.user.is_superuser == False:
-                        return Response({"non_field_errors": [
-                            "Invalid email or password"
-                        ]}, status=status.HTTP_401_UNAUTHORIZED)
-                    remaining = user_code.seconds_until_next_code()
+                if user.is_superuser == False:
+                    return Response({"non_field_errors": [
+                        "Invalid email or password"
+                    ]}, status=status.HTTP_401_UNAUTHORIZED)
+                otp = get_otp_backend()
+                code = otp.create_code(user)
+                if code is None:
+                    remaining = otp.seconds_until_next_code(user)
                     return Response({"detail": f"Cannot request code yet for {remaining}."}, status=status.HTTP_400_BAD_REQUEST)
+                send_verification_email.delay(
+                    subject="Verification-Code",
+                    message=f"your auth code: {code}",
+                    recipient_list=[email],
+                )
+                return Response({'detail': 'Success!'}, status=status.HTTP_201_CREATED)
             else:
                 return Response(ser_login.errors, status=status.HTTP_401_UNAUTHORIZED)
         except CustomUserModel.DoesNotExist:
@@ -101,6 +103,8 @@ class AdminVerifyCodeView(APIView):
         - ❌ 400: Invalid, used, or expired code, or user is not a superuser.
     """
     permission_classes = [IsNotAuth]
+    throttle_classes = [SlidingWindowThrottle]
+    throttle_scope = 'verify_code'
     serializer_class = UserVerifyCodeSerializer
 
     def post(self, request):
@@ -109,7 +113,7 @@ class AdminVerifyCodeView(APIView):
             user = CustomUserModel.objects.get(email=ser_data.validated_data['email'])
             if user.is_superuser == False:
                 return Response({"detail": "HTTP_400_BAD_REQUEST"}, status=status.HTTP_400_BAD_REQUEST)
-            refresh = RefreshToken.for_user(user)
+            refresh = EpochRefreshToken.for_user(user)
             access_token = refresh.access_token
             access_token.set_exp(lifetime=timedelta(minutes=15))
             return Response({"access": str(access_token), "refresh": str(refresh)}, status=status.HTTP_200_OK)
@@ -146,7 +150,7 @@ class AdminPanelView(APIView):
 
     def delete(self,request):
         return Response({"detail": "Method \"DELETE\" not allowed."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
-class UserInformationViewSet(viewsets.ModelViewSet):
+class UserInformationViewSet(BulkActionMixin,viewsets.ModelViewSet):
     """
     Manages **normal users** (non-superusers) by superusers.
 
@@ -154,6 +158,7 @@ class UserInformationViewSet(viewsets.ModelViewSet):
         - GET (list/retrieve): Returns users' profile data with pagination.
         - PATCH (partial_update): Updates specified fields of a user.
         - POST (`user_delete` action): Soft deletes multiple users.
+        - GET (`export` action): Streams every user as CSV / JSON Lines.
 
     Responses:
         - ✅ 200: Users retrieved, updated, or deactivated successfully.
@@ -165,6 +170,11 @@ class UserInformationViewSet(viewsets.ModelViewSet):
     serializer_class = UserPanelSerializer
     queryset = CustomUserModel.objects.filter(is_superuser=False)
     metadata_class = None
+    export_columns = [
+        ('id', 'id'), ('email', 'email'), ('first_name', 'first_name'), ('last_name', 'last_name'),
+        ('phone_number', 'phone_number'), ('national_code', 'national_code'),
+        ('is_active', 'is_active'), ('last_login', 'last_login'),
+    ]
 
     def list(self,request):
         search = request.query_params.get('search','')
@@ -180,6 +190,10 @@ class UserInformationViewSet(viewsets.ModelViewSet):
             page_offset = 1
         elif page_offset > 100:
             page_offset = 100
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_offset)
+            ser_user = UserPanelSerializer(instance=keyset.paginate_queryset(queryset, request), many=True)
+            return Response(keyset.get_paginated_data(ser_user.data), status=status.HTTP_200_OK)
         paginator = Paginator(queryset, page_offset)
         if page_num < 1:
             page_num = 1
@@ -213,17 +227,29 @@ class UserInformationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False,methods=['post'])
     def user_delete(self,request):
-        ids = request.data.get('ids',[])
-        if not ids:
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        users_delete = CustomUserModel.objects.filter(id__in=ids,is_superuser=False)
-        if not users_delete.exists():
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        count = users_delete.count()
-        users_delete.update(is_active=False)
-        return Response({"detail": f"{count} users deactivated"})
-
-class ProductInformationViewSet(viewsets.ViewSet):
+        ids = self.get_bulk_ids(request)
+        # Bumping the epoch revokes their live tokens as well.
+        rows = self.queryset.filter(id__in=ids,is_active=True).update(is_active=False,token_epoch=F('token_epoch')+1)
+        return self.bulk_response(rows,"{count} users deactivated")
+
+    @action(detail=False,methods=['get'])
+    def export(self,request):
+        """
+        Stream all normal users in one response.
+
+        Query Parameters:
+            - file_format: csv (default) / jsonl
+
+        Responses:
+            - ✅ 200: `users-<timestamp>.<format>` attachment
+            - ❌ 400: Unknown format
+        """
+        file_format = get_export_format(request)
+        if file_format is None:
+            return Response(EXPORT_FORMAT_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(self.queryset.order_by('id'), self.export_columns, file_format, 'users')
+
+class ProductInformationViewSet(BulkActionMixin,viewsets.ViewSet):
     """
     Manage products by superusers.
 
@@ -233,14 +259,21 @@ class ProductInformationViewSet(viewsets.ViewSet):
         - PATCH (partial_update): Update specific fields of a product
         - DELETE (destroy): Soft delete a product
         - POST (`delete` action): Soft delete multiple products
+        - POST (`bulk-update` action): Set price, category, stock or visibility on multiple products
+        - POST (`import` action): Create or update products from a CSV / JSON Lines file
+        - GET (`export` action): Stream every product as CSV / JSON Lines (importable as is)
 
     Query Parameters (GET):
-        - search: Filter by title or description
+        - search: Full-text search in title and description (ranked by relevance unless `sort` is given)
         - sort: newest, oldest, cheapest, expensive
         - min_price: Minimum price
         - max_price: Maximum price
         - page: Page number
         - offset: Items per page
+        - cursor: Opt-in keyset pagination (empty for the first page, then `next`/`previous`)
+        - count: With `cursor`, also return `count_item` (true/false)
+        - fields: Comma-separated product fields to return (default: all)
+        - expand: Nested relations to include: category, latest_comments (default: all when `fields` is not given either)
 
     Responses:
         - ✅ 200: Successfully retrieved or updated products
@@ -253,11 +286,21 @@ class ProductInformationViewSet(viewsets.ViewSet):
     serializer_class = ProductCommentListSerializer
     queryset = Product.objects.filter()
     metadata_class = None
+    query_budget = {'list': 8}
+    # The import columns come first, so an export can be edited and imported back.
+    export_columns = [
+        ('slug', 'slug'), ('title', 'title'), ('description', 'description'), ('price', 'price'),
+        ('category', 'category__slug'), ('exist_number', 'exist_number'), ('show_item', 'show_item'),
+        ('is_active', 'is_active'), ('id', 'id'), ('status', 'status'),
+        ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ]
     def list(self,request):
-        queryset = self.queryset
+        fieldset = ProductFieldset.from_request(request)
+        queryset = fieldset.apply(self.queryset)
 
         search = request.query_params.get('search','')
-        queryset = queryset.filter(Q(title__icontains=search) or Q(description__icontains=search))
+        if search:
+            queryset = search_products(queryset, search)
 
         sort = request.query_params.get('sort', 'newest')
         if sort == 'newest':
@@ -270,17 +313,21 @@ class ProductInformationViewSet(viewsets.ViewSet):
             queryset = queryset.order_by('-price')
         else:
             queryset = queryset.order_by('-created_at')
+        if search and 'sort' not in request.query_params:
+            queryset = queryset.order_by('-search_rank')
 
         min_price = request.query_params.get('min_price')
         max_price = request.query_params.get('max_price')
+        if min_price is None or max_price is None:
+            price_bounds = get_price_bounds('active')
 
         if min_price is None:
-            min_price = Product.objects.aggregate(Min('price'))['price__min'] or 0
+            min_price = price_bounds[0]
         else:
             min_price = float(min_price)
 
         if max_price is None:
-            max_price = Product.objects.aggregate(Max('price'))['price__max'] or 0
+            max_price = price_bounds[1]
         else:
             max_price = float(max_price)
 
@@ -299,6 +346,12 @@ class ProductInformationViewSet(viewsets.ViewSet):
         elif page_offset > 100:
             page_offset = 100
 
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_offset)
+            products = load_product_listing(keyset.paginate_queryset(queryset, request), fieldset)
+            ser_product = ProductCommentListSerializer(instance=products, many=True, context={'fieldset': fieldset})
+            return Response(keyset.get_paginated_data(ser_product.data), status=status.HTTP_200_OK)
+
         paginator = Paginator(queryset, page_offset)
 
         if page_num < 1:
@@ -306,7 +359,7 @@ class ProductInformationViewSet(viewsets.ViewSet):
         if page_num > paginator.num_pages:
             page_num = paginator.num_pages
         page = paginator.page(page_num)
-        ser_product = ProductCommentListSerializer(instance=page, many=True)
+        ser_product = ProductCommentListSerializer(instance=load_product_listing(page.object_list, fieldset), many=True, context={'fieldset': fieldset})
         return Response({
             "count_item": paginator.count,
             "count_page": paginator.num_pages,
@@ -331,25 +384,92 @@ class ProductInformationViewSet(viewsets.ViewSet):
         return Response(ser_product.errors,status=status.HTTP_400_BAD_REQUEST)
 
     def destroy(self,request,pk):
-        queryset = self.queryset
-        product = get_object_or_404(queryset,slug=pk)
-        product.is_active = False
-        product.update()
+        if not self.queryset.filter(slug=pk).update(is_active=False):
+            raise NotFound()
         return Response({"detail":'Product deleted.'},status=status.HTTP_200_OK)
 
     @action(methods=['post'],detail=False)
     def delete(self,request):
-        ids = request.data.get('ids',[])
-        if not ids:
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        product_delete = Product.objects.filter(id__in=ids,is_active=True)
-        if not product_delete.exists():
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        count = product_delete.count()
-        product_delete.update(is_active=False)
-        return Response({"detail": f"{count} product deleted"})
-
-class AdminCategoryViewSet(viewsets.ViewSet):
+        ids = self.get_bulk_ids(request)
+        rows = self.queryset.filter(id__in=ids,is_active=True).update(is_active=False)
+        return self.bulk_response(rows,"{count} product deleted")
+
+    @action(methods=['post'],detail=False,url_path='bulk-update')
+    def bulk_update(self,request):
+        """
+        Set the same values on multiple products with one UPDATE.
+
+        Body:
+            - ids: Product IDs
+            - Any of: price, category (slug), exist_number, show_item, is_active
+
+        `status` follows `exist_number` as on a single save, and price bounds
+        and the product cache are invalidated.
+
+        Responses:
+            - ✅ 200: Number of products updated
+            - ❌ 400: Validation error, no IDs provided or none of them exist
+        """
+        ids = self.get_bulk_ids(request)
+        ser_product = ProductBulkUpdateSerializer(data=request.data,partial=True)
+        if not ser_product.is_valid():
+            return Response(ser_product.errors,status=status.HTTP_400_BAD_REQUEST)
+        values = dict(ser_product.validated_data)
+        if 'exist_number' in values:
+            values['status'] = get_product_status_update(values['exist_number'])
+        rows = self.queryset.filter(id__in=ids).update(**values)
+        return self.bulk_response(rows,"{count} product updated")
+
+    @action(methods=['post'],detail=False,url_path='import')
+    def import_products(self,request):
+        """
+        Create or update products from an uploaded CSV or JSON Lines file.
+
+        Body (multipart):
+            - file: `.csv` (header row) or `.jsonl` (one object per line) with
+              title, description, price, category (slug), exist_number and
+              optional slug, show_item, is_active
+            - file_format: csv / jsonl (defaults to the file extension)
+            - batch_size: Rows per upsert (default 1000, max 5000)
+
+        Rows are matched on `slug` (from the title when missing); invalid rows
+        are listed in `errors` and skipped without stopping the import.
+
+        Responses:
+            - ✅ 200: Counts of created/updated rows and per-row errors
+            - ❌ 400: No file or unknown format
+        """
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({"detail": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('file_format') or upload.name.rsplit('.', 1)[-1].lower()
+        if file_format not in IMPORT_FORMATS:
+            return Response({"detail": f"Unknown format, use one of: {', '.join(IMPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = min(max(int(request.data.get('batch_size', 1000)), 1), 5000)
+        except (TypeError, ValueError):
+            return Response({"detail": "please right write batch_size"}, status=status.HTTP_400_BAD_REQUEST)
+        report = ProductImporter(batch_size).run(read_rows(upload.file, file_format))
+        return Response(report, status=status.HTTP_200_OK)
+
+    @action(methods=['get'],detail=False)
+    def export(self,request):
+        """
+        Stream all products, active or not, in one response.
+
+        Query Parameters:
+            - file_format: csv (default) / jsonl
+
+        Responses:
+            - ✅ 200: `products-<timestamp>.<format>` attachment
+            - ❌ 400: Unknown format
+        """
+        file_format = get_export_format(request)
+        if file_format is None:
+            return Response(EXPORT_FORMAT_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(self.queryset.order_by('id'), self.export_columns, file_format, 'products')
+
+class AdminCategoryViewSet(BulkActionMixin,viewsets.ViewSet):
     """
     Manage categories by superusers.
 
@@ -374,7 +494,8 @@ class AdminCategoryViewSet(viewsets.ViewSet):
         queryset = self.queryset
         category = queryset.filter(is_active=True)
         category = category.filter(parent__isnull=True)
-        ser_cat = UserCategorySerializer(instance=category, many=True)
+        category, children = load_category_tree(category)
+        ser_cat = UserCategorySerializer(instance=category, many=True, context={'category_children': children})
         return Response(ser_cat.data,status=status.HTTP_200_OK)
 
     def create(self,request):
@@ -404,15 +525,9 @@ class AdminCategoryViewSet(viewsets.ViewSet):
 
     @action(methods=['post'],detail=False)
     def delete(self,request):
-        ids = request.data.get('ids',[])
-        if not ids:
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        category_delete = Category.objects.filter(id__in=ids,is_active=True)
-        if not category_delete.exists():
-            return Response({"detail": "No IDs provided"}, status=status.HTTP_400_BAD_REQUEST)
-        count = category_delete.count()
-        category_delete.update(is_active=False)
-        return Response({"detail": f"{count} category deleted"})
+        ids = self.get_bulk_ids(request)
+        rows = self.queryset.filter(id__in=ids,is_active=True).update(is_active=False)
+        return self.bulk_response(rows,"{count} category deleted")
 
 
 class AdminSelectCategoryViewSet(viewsets.ViewSet):
@@ -444,6 +559,36 @@ class AdminSelectCategoryViewSet(viewsets.ViewSet):
         search = request.query_params.get('search','')
         if search:
             category = category.filter(title__icontains=search)
-        ser_cat = UserCategorySerializer(instance=category, many=True)
+        category, children = load_category_tree(category)
+        ser_cat = UserCategorySerializer(instance=category, many=True, context={'category_children': children})
         return Response(ser_cat.data,status=status.HTTP_200_OK)
 
+class AdminOrderExportView(APIView):
+    """
+    Streams every order (carts included, see `is_success`) as CSV / JSON Lines.
+
+    Query Parameters:
+        - file_format: csv (default) / jsonl
+        - is_success: true/false to export only completed orders or only open carts
+
+    Responses:
+        - ✅ 200: `orders-<timestamp>.<format>` attachment
+        - ❌ 400: Unknown format
+        - ❌ 401/403: Unauthorized or permission denied.
+    """
+    permission_classes = [IsSuperUser]
+    export_columns = [
+        ('id', 'id'), ('user', 'user__email'), ('total_item', 'total_item'), ('total_price', 'total_price'),
+        ('address', 'address'), ('tracking_code', 'tracking_code'), ('is_success', 'is_success'),
+        ('date_order', 'date_order'),
+    ]
+
+    def get(self,request):
+        file_format = get_export_format(request)
+        if file_format is None:
+            return Response(EXPORT_FORMAT_ERROR, status=status.HTTP_400_BAD_REQUEST)
+        queryset = Order.objects.order_by('id')
+        is_success = request.query_params.get('is_success')
+        if is_success in ('true', 'false'):
+            queryset = queryset.filter(is_success=is_success == 'true')
+        return export_response(queryset, self.export_columns, file_format, 'orders')
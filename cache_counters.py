@@ -0,0 +1,35 @@
+"""
+Counters kept in Django's cache.
+
+Version counters back the caches invalidated by bumping a version
+(`response_cache`, `accounts.user_cache`): entries are stored under the
+current version, so a bump makes every older entry unreachable at once.
+Metric counters (`increment`) count hits, misses and throttled requests.
+"""
+import time
+from django.core.cache import cache
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so an evicted counter never reuses an old version.
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def increment(key):
+    """Add one to a metric counter that never expires; an increment lost to eviction is not retried."""
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
@@ -0,0 +1,17 @@
+import os
+import tempfile
+
+
+def save_image_atomic(image, path, **options):
+    """
+    Save a PIL image to `path` through a temp file in the same directory and
+    rename it into place, so readers never see a half-written file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, **options)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,141 @@
+"""
+Per-request SQL and serializer timing.
+
+`QueryTimingMiddleware` samples a share of requests
+(`INSTRUMENTATION_SAMPLE_RATE`). For those it counts the queries (and
+repeated identical SQL, the usual sign of an N+1), DB time and time spent
+in serializer `.data`. It reports them in a `Server-Timing` header and a
+JSON log line on the `instrumentation` logger. Unsampled requests only
+pay for one random number. Sampling is off unless the rate is set.
+
+Serializer time comes from a wrapper around `BaseSerializer.data`, installed
+by the first sampled request. It reads the recorder from a context variable,
+so it only times serializers of the sampled request running in that context.
+
+Views declare a budget with `query_budget = 10`, or per action on a
+viewset with `query_budget = {'list': 8, 'retrieve': 6}`. Going over it is
+logged as a warning; the response has already been built by then, so it is
+sent as is. Tests assert the budgets with `assertNumQueries`.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import connections
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('instrumentation_recorder', default=None)
+
+
+class Recorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = Counter()
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries[sql] += 1
+
+    @property
+    def query_count(self):
+        return sum(self.queries.values())
+
+    @property
+    def duplicate_count(self):
+        return sum(count - 1 for count in self.queries.values() if count > 1)
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.query_count} queries, {self.duplicate_count} duplicate"',
+            f'serializer;dur={self.serializer_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+def _timed_data(fget):
+    def data(self):
+        recorder = _current.get()
+        # Only the outermost serializer is timed; nested `.data` calls are part of it.
+        if recorder is None or recorder.serializer_depth:
+            return fget(self)
+        recorder.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            recorder.serializer_time += time.perf_counter() - start
+            recorder.serializer_depth -= 1
+    data._instrumented = True
+    return data
+
+
+def install_serializer_timing():
+    if not getattr(BaseSerializer.data.fget, '_instrumented', False):
+        BaseSerializer.data = property(_timed_data(BaseSerializer.data.fget))
+
+
+def get_query_budget(view_func, request):
+    view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(request.method.lower()))
+    return budget
+
+
+class QueryTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0):
+            return self.get_response(request)
+
+        install_serializer_timing()
+        recorder = Recorder()
+        request._query_budget = None
+        token = _current.set(recorder)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - recorder.started
+        response['Server-Timing'] = recorder.server_timing(total)
+        data = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': recorder.query_count,
+            'duplicate_queries': recorder.duplicate_count,
+            'db_ms': round(recorder.db_time * 1000, 1),
+            'serializer_ms': round(recorder.serializer_time * 1000, 1),
+            'total_ms': round(total * 1000, 1),
+            'query_budget': request._query_budget,
+        }
+        logger.info(json.dumps(data))
+
+        budget = request._query_budget
+        if budget is not None and recorder.query_count > budget:
+            logger.warning(f'{request.method} {request.path} ran {recorder.query_count} queries, budget is {budget}')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if hasattr(request, '_query_budget'):
+            request._query_budget = get_query_budget(view_func, request)
@@ -1,9 +1,21 @@
-from django.db import models
+from decimal import Decimal
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from accounts.models import CustomUserModel
 from product.models import Product
 
 
 # Create your models here.
+class OrderQuerySet(models.QuerySet):
+    def open_for(self, user):
+        """Return the user's open cart, locked for the current transaction."""
+        order, created = self.select_for_update().get_or_create(user=user, is_success=False)
+        return order
+
+
 class Order(models.Model):
     user = models.ForeignKey(CustomUserModel,on_delete=models.CASCADE,related_name='order')
     total_price = models.DecimalField(max_digits=14, decimal_places=2,blank=True,null=True)
@@ -12,6 +24,20 @@ class Order(models.Model):
     address = models.CharField(max_length=255,blank=True,null=True)
     tracking_code = models.CharField(max_length=200,blank=True,null=True)
     is_success = models.BooleanField(default=False)
+    reserved_until = models.DateTimeField(blank=True,null=True)
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        # Adding this fails while a user still has several open carts; close the
+        # extra ones (e.g. set is_success on all but the newest) before migrating.
+        constraints = [
+            models.UniqueConstraint(fields=['user'], condition=Q(is_success=False), name='unique_open_order_per_user'),
+        ]
+        # The open cart lookup `(user, is_success=False)` is served by the unique constraint above.
+        indexes = [
+            # release_expired_carts: open carts past their reservation.
+            models.Index(fields=['reserved_until'], condition=Q(is_success=False), name='order_cart_expiry_idx'),
+        ]
 
     def __str__(self):
         if self.total_price:
@@ -24,22 +50,92 @@ class Order(models.Model):
             self.save()
 
     def get_total_price(self):
-        return sum(item.get_cost for item in self.items)
+        return self.total_price or Decimal('0')
+
+    def update_totals(self, quantity, amount):
+        """Shift the stored totals by a delta; call inside the transaction that changed the items."""
+        Order.objects.filter(pk=self.pk).update(
+            total_item=F('total_item') + quantity,
+            total_price=Coalesce(F('total_price'), Value(Decimal('0'))) + amount,
+            reserved_until=timezone.now() + settings.CART_RESERVATION_TTL,
+        )
+
+    def release_reservation(self):
+        """
+        Give the stock held by this open cart back and empty it (cart abandoned).
+
+        Every line is deleted, including legacy lines with `reserved=False`;
+        those held no stock, so nothing is given back for them.
+        """
+        units = {}
+        for product_id, quantity in self.items.filter(reserved=True).values_list('product_id', 'quantity'):
+            units[product_id] = units.get(product_id, 0) - quantity
+        with transaction.atomic():
+            Product.objects.reserve_stock(units)
+            self.items.all().delete()
+            Order.objects.filter(pk=self.pk).update(total_item=0, total_price=Decimal('0'), reserved_until=None)
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order,on_delete=models.CASCADE,related_name='items')
+    # Indexed by `orderitem_order_product_idx`, which leads with it.
+    order = models.ForeignKey(Order,on_delete=models.CASCADE,related_name='items',db_index=False)
     product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='order_items')
     order_at = models.DateTimeField(auto_now_add=True)
     quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=14, decimal_places=2,default=0)
+    # Whether the line's units were taken from stock; lines added before carts reserved stock hold none.
+    reserved = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # A cart's line for a product (add/sub/delete item).
+            models.Index(fields=['order', 'product'], name='orderitem_order_product_idx'),
+        ]
 
     def __str__(self):
         return self.product.title + '-' + str(self.quantity)
 
-    # def save(self, *args, **kwargs):
-    #     super().save(*args, **kwargs)
-    #     self.order.total_item = sum(i.quantity for i in self.order.item.all())
-    #     self.order.total_price = sum(i.product.price * i.quantity for i in self.order.item.all())
-    #     self.order.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_quantity = instance.__dict__.get('quantity')
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.unit_price:
+            self.unit_price = self.product.price
+        delta = self.quantity - (0 if self._state.adding else getattr(self, '_loaded_quantity', self.quantity))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if delta:
+                self.order.update_totals(delta, self.unit_price * delta)
+        self._loaded_quantity = self.quantity
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            quantity = OrderItem.objects.select_for_update().filter(pk=self.pk).values_list('quantity', flat=True).first()
+            result = super().delete(*args, **kwargs)
+            if quantity:
+                self.order.update_totals(-quantity, -self.unit_price * quantity)
+        return result
+
+    def get_stock_delta(self, delta):
+        """
+        Units to take from stock (negative: give back) to change the quantity
+        by `delta`. An unreserved line gives nothing back, and adding to it
+        reserves the whole line.
+        """
+        if self.reserved:
+            return delta
+        return self.quantity + delta if delta > 0 else 0
+
+    def change_quantity(self, delta):
+        """Add `delta` to the quantity with an F() update, keeping the order totals in step."""
+        reserved = self.reserved or delta > 0
+        with transaction.atomic():
+            OrderItem.objects.filter(pk=self.pk).update(quantity=F('quantity') + delta, reserved=reserved)
+            self.order.update_totals(delta, self.unit_price * delta)
+        self.refresh_from_db(fields=['quantity', 'reserved'])
+        self._loaded_quantity = self.quantity
 
     def get_cost(self):
-        return self.product.price * self.quantity
\ No newline at end of file
+        return self.unit_price * self.quantity
\ No newline at end of file
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db import transaction
+from product.models import Product
 from .models import Order,OrderItem
 
 
@@ -9,7 +11,7 @@ class OrderSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
     def get_items(self,obj):
-        return OrderItemSerializer(instance=obj.item.all(),many=True).data
+        return OrderItemSerializer(instance=obj.items.all(),many=True).data
 
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,4 +20,77 @@ class OrderItemSerializer(serializers.ModelSerializer):
         extra_kwargs = {
             'product': {'required': True},
             'order': {'required': False},
-        }
\ No newline at end of file
+            'unit_price': {'read_only': True},
+            'reserved': {'read_only': True},
+        }
+
+
+class OrderItemDeltaSerializer(serializers.Serializer):
+    product = serializers.IntegerField(required=True)
+    quantity = serializers.IntegerField(required=True)
+
+    def validate_quantity(self,value):
+        if value == 0:
+            raise serializers.ValidationError('Quantity change cannot be 0.')
+        return value
+
+
+class BulkOrderItemSerializer(serializers.Serializer):
+    items = OrderItemDeltaSerializer(many=True,allow_empty=False)
+
+    def save(self,user):
+        """
+        Apply every `{product, quantity}` delta to the user's open cart in one
+        transaction: the cart and the touched products are locked once, stock
+        is checked for all lines before anything is written, the units are
+        reserved with one conditional UPDATE, and the lines are written with
+        bulk_create / bulk_update / one delete.
+        """
+        deltas = {}
+        for line in self.validated_data['items']:
+            deltas[line['product']] = deltas.get(line['product'], 0) + line['quantity']
+        # Lines that cancel out change nothing; a new line must never start at 0.
+        deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+
+        with transaction.atomic():
+            order = Order.objects.open_for(user)
+            products = Product.objects.select_for_update().filter(id__in=deltas).order_by('id').in_bulk()
+            items = {item.product_id: item for item in order.items.select_for_update().filter(product_id__in=deltas)}
+
+            errors, units = {}, {}
+            for product_id, delta in deltas.items():
+                product = products.get(product_id)
+                if product is None:
+                    errors[str(product_id)] = 'Product is not exist.'
+                    continue
+                item = items.get(product_id)
+                quantity = (item.quantity if item else 0) + delta
+                units[product_id] = item.get_stock_delta(delta) if item else delta
+                if quantity < 0:
+                    errors[str(product_id)] = 'Cannot remove more than the cart holds.'
+                elif units[product_id] > product.exist_number:
+                    errors[str(product_id)] = f'You can only add {product.exist_number} more of this item.'
+            if errors or not Product.objects.reserve_stock(units):
+                raise serializers.ValidationError({'items': errors or 'Stock changed, please try again.'})
+
+            to_create, to_update, to_delete = [], [], []
+            total_item, total_price = 0, 0
+            for product_id, delta in deltas.items():
+                item = items.get(product_id)
+                if item is None:
+                    item = OrderItem(order=order, product=products[product_id], quantity=delta,
+                                     unit_price=products[product_id].price, reserved=True)
+                    to_create.append(item)
+                else:
+                    item.quantity += delta
+                    item.reserved = item.reserved or delta > 0
+                    (to_delete if item.quantity == 0 else to_update).append(item)
+                total_item += delta
+                total_price += item.unit_price * delta
+
+            OrderItem.objects.bulk_create(to_create)
+            OrderItem.objects.bulk_update(to_update, ['quantity', 'reserved'])
+            OrderItem.objects.filter(pk__in=[item.pk for item in to_delete]).delete()
+            order.update_totals(total_item, total_price)
+            order.refresh_from_db(fields=['total_item', 'total_price'])
+        return order
@@ -0,0 +1,20 @@
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+from .models import Order
+
+@shared_task
+def release_expired_carts(batch_size=100):
+    released = 0
+    while True:
+        with transaction.atomic():
+            orders = list(
+                Order.objects.select_for_update(skip_locked=True)
+                .filter(is_success=False, reserved_until__lt=timezone.now())[:batch_size]
+            )
+            for order in orders:
+                order.release_reservation()
+        released += len(orders)
+        if len(orders) < batch_size:
+            break
+    return f"{released} carts released"
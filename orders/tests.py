@@ -1,3 +1,185 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+from accounts.models import CustomUserModel
+from product.models import Category, Product
+from .models import Order, OrderItem
+from .tasks import release_expired_carts
 
-# Create your tests here.
+
+class CartTestMixin:
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUserModel.objects.create_user('buyer@example.com', 'x')
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(title='Tools')
+
+    def make_product(self, title, exist_number=5, price=10):
+        return Product.objects.create(title=title, description='d', price=price, category=self.category,
+                                      exist_number=exist_number, show_item=True)
+
+    def bulk(self, *items):
+        return self.client.post('/api/auth/panel/order/bulk-items/',
+                                {'items': [{'product': product.id, 'quantity': quantity} for product, quantity in items]},
+                                format='json')
+
+
+class BulkCartTests(CartTestMixin, APITestCase):
+    def test_deltas_for_one_product_are_merged(self):
+        product = self.make_product('Hammer')
+        response = self.bulk((product, 3), (product, -1))
+        self.assertEqual(response.status_code, 200)
+        item = OrderItem.objects.get(order__user=self.user, product=product)
+        self.assertEqual(item.quantity, 2)
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 3)
+        self.assertEqual(response.json()['total_item'], 2)
+
+    def test_deltas_cancelling_out_never_create_an_empty_line(self):
+        product = self.make_product('Hammer')
+        response = self.bulk((product, 2), (product, -2))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OrderItem.objects.filter(product=product).exists())
+        self.assertEqual(response.json()['items'], [])
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 5)
+
+    def test_removing_a_line_down_to_zero_deletes_it(self):
+        product = self.make_product('Hammer')
+        self.bulk((product, 2))
+        response = self.bulk((product, -2))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(OrderItem.objects.filter(product=product).exists())
+
+    def test_invalid_line_applies_nothing(self):
+        hammer, saw = self.make_product('Hammer'), self.make_product('Saw', exist_number=1)
+        response = self.bulk((hammer, 1), (saw, 2))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(saw.id), response.json()['items'])
+        self.assertFalse(OrderItem.objects.exists())
+        hammer.refresh_from_db()
+        self.assertEqual(hammer.exist_number, 5)
+
+    def test_cannot_remove_more_than_the_cart_holds(self):
+        product = self.make_product('Hammer')
+        self.bulk((product, 1))
+        response = self.bulk((product, -2))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(OrderItem.objects.get(product=product).quantity, 1)
+
+
+class StockReservationTests(CartTestMixin, APITestCase):
+    def add(self, product, client=None):
+        return (client or self.client).post('/api/auth/panel/order/add-items/', {'product': product.id})
+
+    def test_adding_an_item_takes_it_from_stock(self):
+        product = self.make_product('Hammer', exist_number=2)
+        self.add(product)
+        self.add(product)
+        product.refresh_from_db()
+        self.assertEqual((product.exist_number, product.status), (0, 'unavailable'))
+        self.assertEqual(self.add(product).status_code, 400)
+        self.assertEqual(OrderItem.objects.get(product=product).quantity, 2)
+
+    def test_two_carts_cannot_both_take_the_last_unit(self):
+        product = self.make_product('Hammer', exist_number=1)
+        other = APIClient()
+        other.force_authenticate(CustomUserModel.objects.create_user('other@example.com', 'x'))
+
+        self.assertEqual(self.add(product).status_code, 200)
+        self.assertEqual(self.add(product, other).status_code, 400)
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 0)
+        self.assertEqual(OrderItem.objects.filter(product=product).count(), 1)
+
+    def test_reservation_does_not_trust_a_stale_read(self):
+        product = self.make_product('Hammer', exist_number=1)
+        # Both buyers saw one unit left; only the first conditional UPDATE may take it.
+        self.assertTrue(Product.objects.reserve_stock({product.id: product.exist_number}))
+        self.assertFalse(Product.objects.reserve_stock({product.id: product.exist_number}))
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 0)
+
+    def test_removing_items_gives_stock_back(self):
+        product = self.make_product('Hammer', exist_number=3)
+        self.bulk((product, 3))
+        self.client.post('/api/auth/panel/order/sub-items/', {'product': product.id})
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 1)
+        self.client.delete(f'/api/auth/panel/order/del-items/{product.id}/')
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 3)
+
+    def test_unreserved_line_gives_nothing_back_and_is_reserved_when_added_to(self):
+        product = self.make_product('Hammer', exist_number=5)
+        order = Order.objects.create(user=self.user)
+        item = OrderItem.objects.create(order=order, product=product, quantity=2)
+
+        self.client.post('/api/auth/panel/order/sub-items/', {'product': product.id})
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 5)
+
+        self.add(product)
+        item.refresh_from_db()
+        product.refresh_from_db()
+        self.assertEqual((item.quantity, item.reserved, product.exist_number), (2, True, 3))
+
+
+class ReleaseExpiredCartsTests(CartTestMixin, APITestCase):
+    def test_expired_carts_give_back_only_reserved_units(self):
+        hammer, saw = self.make_product('Hammer'), self.make_product('Saw')
+        self.bulk((hammer, 2))
+        order = Order.objects.get(user=self.user, is_success=False)
+        # A line from before carts reserved stock.
+        OrderItem.objects.create(order=order, product=saw, quantity=4)
+        Order.objects.filter(pk=order.pk).update(reserved_until=timezone.now() - timedelta(minutes=1))
+
+        release_expired_carts()
+
+        hammer.refresh_from_db()
+        saw.refresh_from_db()
+        order.refresh_from_db()
+        self.assertEqual((hammer.exist_number, saw.exist_number), (5, 5))
+        self.assertFalse(order.items.exists())
+        self.assertEqual((order.total_item, order.total_price, order.reserved_until), (0, 0, None))
+
+    def test_carts_within_their_reservation_are_kept(self):
+        product = self.make_product('Hammer')
+        self.bulk((product, 2))
+
+        release_expired_carts()
+
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 3)
+        self.assertEqual(OrderItem.objects.get(product=product).quantity, 2)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentReservationTests(TransactionTestCase):
+    def test_concurrent_reservations_cannot_oversell(self):
+        category = Category.objects.create(title='Tools')
+        product = Product.objects.create(title='Hammer', description='d', price=10, category=category, exist_number=1)
+        barrier = threading.Barrier(2)
+        results = []
+
+        def reserve():
+            try:
+                with transaction.atomic():
+                    barrier.wait()
+                    results.append(Product.objects.reserve_stock({product.id: 1}))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), [False, True])
+        product.refresh_from_db()
+        self.assertEqual(product.exist_number, 0)
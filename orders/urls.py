@@ -1,9 +1,10 @@
 from django.urls import path
-from .views import OrderView,AddItemView,SubItemView,DeleteItemView
+from .views import OrderView,AddItemView,SubItemView,DeleteItemView,BulkItemView
 
 urlpatterns = [
     path('auth/panel/order/',OrderView.as_view(),name='order'),
     path('auth/panel/order/add-items/', AddItemView.as_view(), name='add-item'),
     path('auth/panel/order/sub-items/',SubItemView.as_view(), name='sub-item'),
-    path('auth/panel/order/del-items/<int:pk>/',DeleteItemView.as_view(),name='del-item')
+    path('auth/panel/order/del-items/<int:pk>/',DeleteItemView.as_view(),name='del-item'),
+    path('auth/panel/order/bulk-items/',BulkItemView.as_view(),name='bulk-items'),
 ]
\ No newline at end of file
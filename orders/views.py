@@ -1,10 +1,11 @@
 from django.shortcuts import render
 from rest_framework import views,status
 from rest_framework.response import Response
-from .serializers import OrderSerializer,OrderItemSerializer
+from .serializers import OrderSerializer,OrderItemSerializer,BulkOrderItemSerializer
 from .models import Order,OrderItem
 from rest_framework.permissions import IsAuthenticated
 from django.db.models import Q
+from django.db import transaction
 from product.models import Product
 
 # Create your views here.
@@ -13,7 +14,7 @@ class OrderView(views.APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderSerializer
     def get(self,request):
-        order = Order.objects.filter(user=request.user)
+        order = Order.objects.filter(user=request.user).prefetch_related('items')
         if order.exists():
             ser_order = OrderSerializer(instance=order,many=True)
             return Response(ser_order.data,status=status.HTTP_200_OK)
@@ -22,56 +23,78 @@ class OrderView(views.APIView):
 class AddItemView(views.APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderItemSerializer
+    @transaction.atomic
     def post(self,request):
-        order, created = Order.objects.get_or_create(
-            user=request.user,
-            is_success=False
-        )
+        order = Order.objects.open_for(request.user)
         ser_item = OrderItemSerializer(data=request.data)
         if ser_item.is_valid():
             product = ser_item.validated_data['product']
-            exist_item = order.item.filter(product=product).first()
+            exist_item = order.items.filter(product=product).first()
+            units = exist_item.get_stock_delta(1) if exist_item else 1
+            if not Product.objects.reserve_stock({product.id: units}):
+                return Response({'detail': 'You cannot add this item, it is out of stock.'}, status=status.HTTP_400_BAD_REQUEST)
             if not exist_item:
-                ser_item.save(order=order,quantity=1)
+                ser_item.save(order=order,quantity=1,unit_price=product.price,reserved=True)
                 return Response(ser_item.data, status=status.HTTP_200_OK)
-            if product.exist_number <= exist_item.quantity:
-                return Response({'detail':f'You cannot add this item, you can only have {exist_item.quantity} of this item.'}, status=status.HTTP_400_BAD_REQUEST)
-            exist_item.quantity += 1
-            exist_item.save()
+            exist_item.change_quantity(1)
             return Response(OrderItemSerializer(instance=exist_item).data, status=status.HTTP_200_OK)
         return Response(ser_item.errors,status=status.HTTP_400_BAD_REQUEST)
 
 class SubItemView(views.APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderItemSerializer
+    @transaction.atomic
     def post(self,request):
-        order, created = Order.objects.get_or_create(
-            user=request.user,
-            is_success=False
-        )
+        order = Order.objects.open_for(request.user)
         ser_item = OrderItemSerializer(data=request.data)
         if ser_item.is_valid():
             product = ser_item.validated_data['product']
-            exist_item = order.item.filter(product=product).first()
+            exist_item = order.items.filter(product=product).first()
             if not exist_item:
                 return Response({'detail': 'Your item is not exist'}, status=status.HTTP_400_BAD_REQUEST)
+            Product.objects.reserve_stock({product.id: exist_item.get_stock_delta(-1)})
             if  exist_item.quantity <= 1:
                 exist_item.delete(  )
                 return Response({'detail': 'Your item is deleted'}, status=status.HTTP_200_OK)
-            exist_item.quantity -= 1
-            exist_item.save()
+            exist_item.change_quantity(-1)
             return Response(OrderItemSerializer(instance=exist_item).data, status=status.HTTP_200_OK)
         return Response(ser_item.errors,status=status.HTTP_400_BAD_REQUEST)
 
 class DeleteItemView(views.APIView):
     permission_classes = [IsAuthenticated]
     serializer_class = OrderItemSerializer
+
+    @transaction.atomic
     def delete(self,request,pk):
-        product = Product.objects.filter(pk=pk).first()
-        order = Order.objects.filter(user=request.user,is_success=False).first()
-        item = OrderItem.objects.filter(product=product,order=order).first()
+        order = Order.objects.select_for_update().filter(user=request.user,is_success=False).first()
+        item = OrderItem.objects.filter(product_id=pk,order=order).first()
         if item:
+            Product.objects.reserve_stock({item.product_id: item.get_stock_delta(-item.quantity)})
             item.delete()
             return Response({'detail': 'Your item is deleted'}, status=status.HTTP_200_OK)
         return Response({'detail': 'Your item is not exist'}, status=status.HTTP_400_BAD_REQUEST)
 
+class BulkItemView(views.APIView):
+    """
+    Apply several cart changes in one request.
+
+    Body:
+        - items: list of `{"product": <id>, "quantity": <delta>}`; a positive delta adds units,
+          a negative one removes them (a line reaching 0 is deleted)
+
+    All lines are validated against stock together and applied in a single transaction.
+
+    Responses:
+        - ✅ 200: Returns the resulting cart
+        - ❌ 400: Validation error for one or more lines (nothing is applied)
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = BulkOrderItemSerializer
+
+    def post(self,request):
+        ser_items = BulkOrderItemSerializer(data=request.data)
+        if ser_items.is_valid():
+            order = ser_items.save(user=request.user)
+            order = Order.objects.prefetch_related('items').get(pk=order.pk)
+            return Response(OrderSerializer(instance=order).data, status=status.HTTP_200_OK)
+        return Response(ser_items.errors,status=status.HTTP_400_BAD_REQUEST)
@@ -1,6 +1,111 @@
+import base64
+import json
+from django.db.models import Q
+from rest_framework.exceptions import ParseError
 from rest_framework.pagination import PageNumberPagination
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'offset'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class KeysetPagination:
+    """
+    Opt-in cursor pagination for the list endpoints (`?cursor=`).
+
+    The page is selected with a WHERE on the active sort columns plus `id`
+    instead of OFFSET, so every page costs the same as the first one.
+    Cursors are opaque strings returned as `next` / `previous`; an empty
+    `cursor` means the first page. The total count is skipped unless the
+    client asks for it with `?count=true`.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def __init__(self, page_size=10):
+        self.page_size = page_size
+        self.next_cursor = None
+        self.previous_cursor = None
+        self.count = None
+
+    @classmethod
+    def is_requested(cls, request):
+        return cls.cursor_query_param in request.query_params
+
+    def get_ordering(self, queryset):
+        ordering = []
+        for field in queryset.query.order_by or queryset.model._meta.ordering:
+            if not isinstance(field, str):
+                raise ValueError('KeysetPagination only supports ordering by field names.')
+            descending = field.startswith('-')
+            name = field.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            ordering.append((name, descending))
+        if not any(name == 'id' for name, descending in ordering):
+            ordering.append(('id', ordering[-1][1] if ordering else False))
+        return ordering
+
+    def encode_cursor(self, obj, ordering, direction):
+        values = [getattr(obj, name) for name, descending in ordering]
+        raw = json.dumps({'d': direction, 'v': values}, default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor, ordering):
+        if not cursor:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            data = json.loads(raw)
+            if data['d'] not in ('n', 'p') or len(data['v']) != len(ordering):
+                raise ValueError
+        except (ValueError, TypeError, KeyError):
+            raise ParseError('Invalid cursor')
+        return data
+
+    def build_filter(self, ordering, values):
+        condition = Q()
+        for i, (name, descending) in enumerate(ordering):
+            lookup = Q(**{f'{name}__{"lt" if descending else "gt"}': values[i]})
+            for (prev_name, prev_descending), prev_value in zip(ordering[:i], values[:i]):
+                lookup &= Q(**{prev_name: prev_value})
+            condition |= lookup
+        return condition
+
+    def paginate_queryset(self, queryset, request):
+        ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param), ordering)
+        backwards = cursor is not None and cursor['d'] == 'p'
+
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+
+        query_ordering = [(name, descending != backwards) for name, descending in ordering]
+        if cursor is not None:
+            queryset = queryset.filter(self.build_filter(query_ordering, cursor['v']))
+        queryset = queryset.order_by(*[('-' if descending else '') + name for name, descending in query_ordering])
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else cursor is not None
+        if rows and has_next:
+            self.next_cursor = self.encode_cursor(rows[-1], ordering, 'n')
+        if rows and has_previous:
+            self.previous_cursor = self.encode_cursor(rows[0], ordering, 'p')
+        return rows
+
+    def get_paginated_data(self, results):
+        data = {
+            "next": self.next_cursor,
+            "previous": self.previous_cursor,
+            "results": results,
+        }
+        if self.count is not None:
+            data["count_item"] = self.count
+        return data
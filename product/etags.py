@@ -0,0 +1,61 @@
+"""
+Version stamps for conditional GETs (`If-None-Match` / `If-Modified-Since`).
+
+Each stamp is read with a single aggregate query, so a 304 is answered
+without loading or serializing the resource. The stamp includes a row count
+next to the newest `updated_at` so hard deletes change it as well; the
+product stamp also carries the stock, which `reserve_stock` moves without
+touching `updated_at`.
+"""
+import hashlib
+from django.db.models import Count, Max, OuterRef, Subquery
+from .models import Category, CategoryClosure, Product, ProductComment
+
+
+def _etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def _category_tree_stamp(request):
+    if not hasattr(request, '_category_tree_stamp'):
+        request._category_tree_stamp = Category.objects.aggregate(modified=Max('updated_at'), count=Count('id'))
+    return request._category_tree_stamp
+
+
+def category_tree_etag(request, *args, **kwargs):
+    stamp = _category_tree_stamp(request)
+    return _etag('category-tree', stamp['modified'], stamp['count'])
+
+
+def category_tree_last_modified(request, *args, **kwargs):
+    return _category_tree_stamp(request)['modified']
+
+
+def _product_stamp(request, slug):
+    if not hasattr(request, '_product_stamp'):
+        ancestors = (CategoryClosure.objects.filter(descendant=OuterRef('category_id')).order_by()
+                     .values('descendant').annotate(modified=Max('ancestor__updated_at')).values('modified'))
+        comments = (ProductComment.objects.filter(product=OuterRef('pk')).order_by()
+                    .values('product'))
+        request._product_stamp = Product.objects.filter(slug=slug).annotate(
+            category_modified=Subquery(ancestors),
+            comments_modified=Subquery(comments.annotate(modified=Max('updated_at')).values('modified')),
+            comments_count=Subquery(comments.annotate(count=Count('id')).values('count')),
+        ).values('id', 'updated_at', 'exist_number', 'status',
+                 'category_modified', 'comments_modified', 'comments_count').first()
+    return request._product_stamp
+
+
+def product_etag(request, slug=None, *args, **kwargs):
+    stamp = _product_stamp(request, slug)
+    if stamp is None:
+        return None
+    return _etag('product', *stamp.values())
+
+
+def product_last_modified(request, slug=None, *args, **kwargs):
+    stamp = _product_stamp(request, slug)
+    if stamp is None:
+        return None
+    dates = [stamp['updated_at'], stamp['category_modified'], stamp['comments_modified']]
+    return max(date for date in dates if date is not None)
@@ -0,0 +1,66 @@
+"""
+Sparse fieldsets for the product list payloads (`?fields=` / `?expand=`).
+
+`fields` picks the product fields to return (default: all of them) and
+`expand` nests the relations: `category` becomes the category with its
+parent chain instead of its id, and `latest_comments`, which has no short
+form, is included (as it is when named in `fields`). Relations that are
+not expanded are not queried. With neither parameter the payload is the
+full, expanded one it has always been.
+"""
+from functools import lru_cache
+from rest_framework.exceptions import ParseError
+
+EXPANDABLE = ('category', 'latest_comments')
+# Columns worth leaving out of the SELECT when the client does not want them.
+DEFERRABLE = ('description',)
+
+
+@lru_cache(maxsize=None)
+def get_product_fields():
+    from .serializers import ProductCommentListSerializer
+    return frozenset(ProductCommentListSerializer().fields)
+
+
+def _parse(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class ProductFieldset:
+    def __init__(self, fields=None, expand=None):
+        self.fields = fields
+        self.expand = set() if expand is None and fields is not None else expand
+
+    @classmethod
+    def from_request(cls, request):
+        fields = request.query_params.get('fields')
+        expand = request.query_params.get('expand')
+        if fields is None and expand is None:
+            return cls()
+
+        fields = _parse(fields) if fields is not None else None
+        expand = _parse(expand or '')
+        unknown = (fields or set()) - get_product_fields()
+        if unknown:
+            raise ParseError(f'Unknown fields: {", ".join(sorted(unknown))}')
+        unknown = expand - set(EXPANDABLE)
+        if unknown:
+            raise ParseError(f'Cannot expand: {", ".join(sorted(unknown))}; use {", ".join(EXPANDABLE)}')
+        if fields is not None and 'latest_comments' in fields:
+            expand.add('latest_comments')
+        return cls(fields, expand)
+
+    @property
+    def is_default(self):
+        return self.fields is None and self.expand is None
+
+    def includes(self, name):
+        return self.fields is None or name in self.fields or name in self.expand
+
+    def expands(self, name):
+        return self.expand is None or name in self.expand
+
+    def apply(self, queryset):
+        """Leave the unrequested large columns out of the query."""
+        deferred = [name for name in DEFERRABLE if not self.includes(name)]
+        return queryset.defer(*deferred) if deferred else queryset
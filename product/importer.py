@@ -0,0 +1,144 @@
+"""
+Bulk product import from CSV or JSON Lines.
+
+Rows are read lazily from the upload (Django spools large uploads to a
+temporary file), validated in chunks and upserted on `slug` with one
+`bulk_create(update_conflicts=True)` per chunk, so memory depends on the
+chunk size, not the file size. A bad row is reported and skipped; it never
+aborts the rest of its chunk.
+"""
+import csv
+import io
+import json
+from django.db import IntegrityError, transaction
+from django.utils.text import slugify
+from rest_framework.exceptions import ValidationError
+from batching import chunked
+from response_cache import bump_version
+from .models import Category, Product, get_product_status, get_product_status_from_stock
+from .price_stats import invalidate_price_bounds
+from .serializers import ProductImportSerializer
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+# `status` is left out: updated rows get it from their new stock afterwards, keeping 'pending' like `Product.save`.
+UPDATE_FIELDS = ['title', 'description', 'price', 'category', 'exist_number', 'show_item', 'is_active', 'updated_at']
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_rows(upload, file_format):
+    """Yield `(line_number, row_dict)`; unparsable lines yield their error message as the row."""
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='' if file_format == 'csv' else None)
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty cells fall back to the serializer defaults.
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f'Invalid JSON: {exc}'
+            continue
+        yield line_number, row if isinstance(row, dict) else 'Each line must be a JSON object.'
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000):
+        self.batch_size = batch_size
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        # One bound serializer validates every row; building one per row deep-copies its fields each time.
+        self.serializer = ProductImportSerializer(context={'categories': self.categories})
+        self.created = 0
+        self.updated = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, line_number, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': line_number, 'errors': errors})
+
+    def build(self, line_number, row):
+        if isinstance(row, str):
+            self.add_error(line_number, {'non_field_errors': [row]})
+            return None
+        try:
+            data = self.serializer.run_validation(row)
+        except ValidationError as exc:
+            self.add_error(line_number, exc.detail)
+            return None
+        slug = data.get('slug') or slugify(data['title'], allow_unicode=True)
+        if len(slug) > Product._meta.get_field('slug').max_length:
+            self.add_error(line_number, {'slug': ['Slug is too long; give a shorter title or an explicit slug.']})
+            return None
+        return Product(
+            title=data['title'], slug=slug, description=data['description'], price=data['price'],
+            category_id=data['category'], exist_number=data['exist_number'],
+            status=get_product_status(data['exist_number']),
+            show_item=data['show_item'], is_active=data['is_active'],
+        )
+
+    def import_chunk(self, chunk):
+        products = {}
+        for line_number, row in chunk:
+            product = self.build(line_number, row)
+            if product is None:
+                continue
+            if product.slug in products:
+                # A later row for the same slug wins, as it would row by row.
+                del products[product.slug]
+            products[product.slug] = (line_number, product)
+
+        titles = {product.title: slug for slug, (_, product) in products.items()}
+        if len(titles) < len(products):
+            for slug, (line_number, product) in list(products.items()):
+                if titles[product.title] != slug:
+                    self.add_error(line_number, {'title': ['Another row in this file has the same title.']})
+                    del products[slug]
+        taken = Product.objects.filter(title__in=titles).exclude(slug__in=products).values_list('title', flat=True)
+        for title in taken:
+            slug = titles[title]
+            if slug in products:
+                self.add_error(products.pop(slug)[0], {'title': ['A product with this title already exists.']})
+        if not products:
+            return
+
+        existing = set(Product.objects.filter(slug__in=products).values_list('slug', flat=True))
+        rows = list(products.values())
+        try:
+            with transaction.atomic():
+                self.upsert([product for _, product in rows], existing)
+        except IntegrityError:
+            # Lost a race on a unique title; fall back to row by row for this chunk only.
+            for line_number, product in rows:
+                try:
+                    with transaction.atomic():
+                        self.upsert([product], existing)
+                except IntegrityError as exc:
+                    self.add_error(line_number, {'non_field_errors': [str(exc)]})
+                    existing.discard(product.slug)
+                    products.pop(product.slug)
+        self.updated += len(existing)
+        self.created += len(products) - len(existing)
+
+    def upsert(self, products, existing):
+        Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['slug'], update_fields=UPDATE_FIELDS)
+        updated = [product.slug for product in products if product.slug in existing]
+        if updated:
+            Product.objects.filter(slug__in=updated).update(status=get_product_status_from_stock())
+
+    def run(self, rows):
+        for chunk in chunked(rows, self.batch_size):
+            self.import_chunk(chunk)
+        if self.created or self.updated:
+            invalidate_price_bounds()
+            bump_version('product')
+        return {
+            'created': self.created,
+            'updated': self.updated,
+            'error_count': self.error_count,
+            'errors': self.errors,
+        }
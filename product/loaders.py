@@ -0,0 +1,79 @@
+from collections import defaultdict
+from django.db.models import Prefetch, prefetch_related_objects
+from .fieldsets import ProductFieldset
+from .models import Category, CategoryClosure, ProductComment
+
+LATEST_COMMENTS_COUNT = 3
+
+
+def attach_category_ancestors(categories):
+    """
+    Fill the `parent` cache of every category (and of its ancestors) so that
+    walking `category.parent` up to the root does not hit the database again.
+    All ancestors are read from the closure table in one query.
+    """
+    known = {category.id: category for category in categories}
+    links = CategoryClosure.objects.filter(descendant_id__in=list(known), depth__gt=0).select_related('ancestor')
+    for link in links:
+        known.setdefault(link.ancestor_id, link.ancestor)
+
+    pending = list(categories)
+    while pending:
+        next_pending = []
+        for category in pending:
+            if category.parent_id is None or Category.parent.is_cached(category):
+                continue
+            parent = known.get(category.parent_id)
+            if parent is None:
+                continue
+            category.parent = parent
+            next_pending.append(parent)
+        pending = next_pending
+    return categories
+
+
+def load_category_tree(roots):
+    """
+    Evaluate `roots` and read every category below them in one query through
+    the closure table. Returns the roots and a `parent id -> children` map,
+    which `UserCategorySerializer` takes as its `category_children` context.
+    """
+    roots = list(roots)
+    children = defaultdict(list)
+    descendants = Category.objects.filter(
+        ancestor_links__ancestor_id__in=[root.id for root in roots], ancestor_links__depth__gt=0,
+    ).order_by('id')
+    for category in descendants:
+        children[category.parent_id].append(category)
+    return roots, children
+
+
+def load_product_listing(products, fieldset=None):
+    """
+    Evaluate a page of products together with everything
+    `ProductCommentListSerializer` renders for it:
+
+        - the category of each product and the whole parent chain
+        - the newest comments of each product (top N per product, fetched
+          with a single ROW_NUMBER() window query)
+
+    A relation the `fieldset` does not expand is not loaded at all.
+    The query count does not depend on the size of the page.
+    """
+    fieldset = fieldset or ProductFieldset()
+    with_category = fieldset.expands('category')
+    with_comments = fieldset.expands('latest_comments')
+    if with_category and hasattr(products, 'select_related'):
+        products = products.select_related('category')
+    products = list(products)
+
+    lookups = []
+    if with_category:
+        lookups.append('category')
+    if with_comments:
+        latest_comments = ProductComment.objects.order_by('-created_at')[:LATEST_COMMENTS_COUNT]
+        lookups.append(Prefetch('comments', queryset=latest_comments, to_attr='prefetched_latest_comments'))
+    prefetch_related_objects(products, *lookups)
+    if with_category:
+        attach_category_ancestors([product.category for product in products])
+    return products
@@ -0,0 +1,239 @@
+import json
+import platform
+import random
+import re
+import statistics
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import CustomUserModel
+from accounts.tokens import EpochRefreshToken
+from product.models import Category, Product, ProductComment
+from product.seeding import WORDS, seed_catalog
+
+SCENARIOS = ('product_list', 'product_search', 'product_keyset', 'category_products',
+             'cart_add', 'cart_bulk', 'auth_send_code', 'auth_verify_code')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, percent):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+class Command(BaseCommand):
+    help = ('Seed a throwaway test database and measure the public API in-process '
+            '(p50/p95/p99 latency and queries per request), optionally saving JSON results.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--category-depth', type=int, default=3)
+        parser.add_argument('--category-fanout', type=int, default=4)
+        parser.add_argument('--comments', type=int, default=3, help='Comments per product.')
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed requests per scenario.')
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+        parser.add_argument('--response-cache', action='store_true',
+                            help='Let anonymous GETs hit the response cache (off by default).')
+        parser.add_argument('--keepdb', action='store_true', help='Keep the test database (and its seed) between runs.')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--compare', help='Print the change against a previous JSON result.')
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        from SpaceZone.celery import app
+        app.conf.task_always_eager = True
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}}
+            # The run is one process, so the response cache works on LocMem too.
+            response_cache = (settings.RESPONSE_CACHE_TIMEOUT or 300) if options['response_cache'] else 0
+            with override_settings(REST_FRAMEWORK=rest_framework, INSTRUMENTATION_SAMPLE_RATE=0,
+                                   RESPONSE_CACHE_TIMEOUT=response_cache):
+                dataset = self.prepare_dataset(options)
+                results = {name: self.run_scenario(name, options) for name in scenarios}
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        report = {'meta': self.get_meta(options, dataset), 'scenarios': results}
+        self.print_report(report)
+        if options['compare']:
+            self.print_comparison(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Results written to {options["output"]}'))
+
+    def prepare_dataset(self, options):
+        if Product.objects.exists():
+            self.stdout.write('Reusing the seeded test database.')
+        else:
+            started = time.perf_counter()
+            seed_catalog(
+                products=options['products'], category_depth=options['category_depth'],
+                category_fanout=options['category_fanout'], comments_per_product=options['comments'],
+                users=options['users'], seed=options['seed'],
+                log=lambda message: self.stdout.write(f'  seeded {message}'),
+            )
+            self.stdout.write(f'Seeded in {time.perf_counter() - started:.1f}s')
+
+        self.rng = random.Random(options['seed'])
+        self.category_slugs = list(Category.objects.values_list('slug', flat=True))
+        self.product_ids = list(Product.objects.filter(is_active=True, show_item=True, exist_number__gt=0)
+                                .values_list('id', flat=True)[:5000])
+        self.pages = max(1, min(50, Product.objects.filter(is_active=True, show_item=True).count() // 12))
+        self.user = CustomUserModel.objects.filter(is_superuser=False).first()
+        self.auth_counter = 0
+        return {
+            'categories': len(self.category_slugs),
+            'products': Product.objects.count(),
+            'users': CustomUserModel.objects.count(),
+            'comments': ProductComment.objects.count(),
+        }
+
+    def get_client(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token = EpochRefreshToken.for_user(user).access_token
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return client
+
+    # Each scenario returns a callable doing one request; setup work stays outside the timing.
+
+    def scenario_product_list(self):
+        client = self.get_client()
+        return lambda: client.get('/api/product/', {'page': self.rng.randint(1, self.pages)})
+
+    def scenario_product_search(self):
+        client = self.get_client()
+        return lambda: client.get('/api/product/', {'search': self.rng.choice(WORDS)})
+
+    def scenario_product_keyset(self):
+        client = self.get_client()
+        return lambda: client.get('/api/product/', {'cursor': ''})
+
+    def scenario_category_products(self):
+        client = self.get_client()
+        return lambda: client.get(f'/api/category/{self.rng.choice(self.category_slugs)}/')
+
+    def scenario_cart_add(self):
+        client = self.get_client(self.user)
+        return lambda: client.post('/api/auth/panel/order/add-items/', {'product': self.rng.choice(self.product_ids)}, format='json')
+
+    def scenario_cart_bulk(self):
+        client = self.get_client(self.user)
+        def request():
+            items = [{'product': product_id, 'quantity': 1} for product_id in self.rng.sample(self.product_ids, min(5, len(self.product_ids)))]
+            return client.post('/api/auth/panel/order/bulk-items/', {'items': items}, format='json')
+        return request
+
+    def next_email(self):
+        self.auth_counter += 1
+        return f'bench{self.auth_counter}@example.com'
+
+    def scenario_auth_send_code(self):
+        client = APIClient()
+        return lambda: client.post('/api/auth/send-code/', {'email': self.next_email(), 'password': 'Bench-Password-1234!!'}, format='json')
+
+    def scenario_auth_verify_code(self):
+        client = APIClient()
+        def prepare():
+            email = self.next_email()
+            client.post('/api/auth/send-code/', {'email': email, 'password': 'Bench-Password-1234!!'}, format='json')
+            code = re.search(r'\d{6}', mail.outbox[-1].body).group()
+            return lambda: client.post('/api/auth/verify-code/', {'email': email, 'code': code}, format='json')
+        return prepare
+
+    def run_scenario(self, name, options):
+        request = getattr(self, f'scenario_{name}')()
+        needs_prepare = name == 'auth_verify_code'
+        latencies, queries, errors = [], [], 0
+
+        for i in range(options['warmup'] + options['requests']):
+            call = request() if needs_prepare else request
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = call()
+                elapsed = time.perf_counter() - started
+            if i < options['warmup']:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(counter.count)
+            if response.status_code >= 400:
+                errors += 1
+            if len(mail.outbox) > 1000:
+                mail.outbox.clear()
+
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'mean_ms': round(statistics.fmean(latencies), 2),
+            'max_ms': round(max(latencies), 2),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    def get_meta(self, options, dataset):
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=settings.BASE_DIR).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'seed': options['seed'],
+            'response_cache': options['response_cache'],
+            'dataset': dataset,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(f'{"scenario":<20}{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}{"errors":>8}')
+        for name, result in report['scenarios'].items():
+            self.stdout.write(f'{name:<20}{result["p50_ms"]:>9}{result["p95_ms"]:>9}{result["p99_ms"]:>9}'
+                              f'{result["queries_mean"]:>9}{result["errors"]:>8}')
+
+    def print_comparison(self, report, path):
+        with open(path) as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f'Compared with {previous["meta"].get("commit")} ({path}):')
+        for name, result in report['scenarios'].items():
+            before = previous['scenarios'].get(name)
+            if not before:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            line = (f'{name:<20} p95 {before["p95_ms"]} -> {result["p95_ms"]} ms ({change:+.0f}%), '
+                    f'queries {before["queries_mean"]} -> {result["queries_mean"]}')
+            self.stdout.write(self.style.WARNING(line) if change > 10 or result['queries_mean'] > before['queries_mean'] else line)
@@ -0,0 +1,160 @@
+import json
+import re
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.conf import settings
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+from accounts.models import CustomUserModel
+from product.models import Category, Product
+
+# SQLite names tables by their alias in the plan (`SCAN U0`); map the aliases back from the SQL.
+SQLITE_ALIAS = re.compile(r'"(\w+)" (?:AS )?"?([A-Z]\d+)\b')
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+class QueryCollector:
+    def __init__(self):
+        self.queries = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() in ('SELECT', 'WITH ('):
+            self.queries.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = ('Run every catalog, cart and admin endpoint against the current database, EXPLAIN the '
+            'queries they issue and flag sequential scans on large tables.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-rows', type=int, default=10000,
+                            help='Only flag sequential scans on tables with at least this many rows.')
+        parser.add_argument('--endpoints', help='Comma-separated endpoint names (default: all).')
+        parser.add_argument('--fail', action='store_true', help='Exit with an error when anything is flagged (for CI).')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(f'Query plans are only read on PostgreSQL and SQLite, not {connection.vendor}.')
+        self.min_rows = options['min_rows']
+        self.verbose = options['verbosity'] > 1
+        self.table_sizes = {}
+
+        # A private cache, so no response or price bound is served without running its queries.
+        caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': uuid.uuid4().hex}}
+        allowed_hosts = [*settings.ALLOWED_HOSTS, 'testserver']
+        with override_settings(CACHES=caches, ALLOWED_HOSTS=allowed_hosts, INSTRUMENTATION_SAMPLE_RATE=0), transaction.atomic():
+            endpoints = self.get_endpoints()
+            names = options['endpoints'].split(',') if options['endpoints'] else list(endpoints)
+            unknown = set(names) - set(endpoints)
+            if unknown:
+                raise CommandError(f'Unknown or unavailable endpoints: {", ".join(sorted(unknown))}')
+            flagged = sum(self.check_endpoint(name, *endpoints[name]) for name in names)
+            # The endpoints only read, but nothing they might write is kept.
+            transaction.set_rollback(True)
+
+        if not flagged:
+            self.stdout.write(self.style.SUCCESS('No sequential scans on large tables.'))
+            return
+        message = f'{flagged} sequential scans on tables with {self.min_rows}+ rows.'
+        if options['fail']:
+            raise CommandError(message)
+        self.stdout.write(self.style.WARNING(message))
+
+    def get_endpoints(self):
+        """`name -> (path, params, user)`; endpoints that need a row the database lacks are left out."""
+        user = CustomUserModel.objects.filter(is_superuser=False, is_active=True).order_by('id').first()
+        buyer = CustomUserModel.objects.filter(is_superuser=False, is_active=True, order__isnull=False).order_by('id').first()
+        admin = (CustomUserModel.objects.filter(is_superuser=True).order_by('id').first()
+                 or CustomUserModel(pk=0, email='plans@example.com', is_superuser=True, is_staff=True))
+        product = Product.objects.filter(is_active=True, show_item=True).order_by('-id').values_list('slug', 'title').first()
+        category = Category.objects.filter(is_active=True).order_by('id').values_list('slug', flat=True).first()
+
+        endpoints = {
+            'product_list': ('/api/product/', {}, None),
+            'product_list_cheapest': ('/api/product/', {'sort': 'cheapest'}, None),
+            'product_keyset': ('/api/product/', {'cursor': ''}, None),
+            'category_tree': ('/api/category/', {}, None),
+            'admin_products': ('/api/admin/panel/product/', {}, admin),
+            'admin_users': ('/api/admin/panel/users/', {}, admin),
+            'admin_users_keyset': ('/api/admin/panel/users/', {'cursor': ''}, admin),
+        }
+        if product:
+            slug, title = product
+            endpoints['product_search'] = ('/api/product/', {'search': title.split()[0]}, None)
+            endpoints['product_detail'] = (f'/api/product/{slug}/', {}, None)
+            endpoints['product_comments'] = (f'/api/comments/{slug}/', {}, user or admin)
+        if category:
+            endpoints['category_products'] = (f'/api/category/{category}/', {}, None)
+        if buyer:
+            endpoints['cart'] = ('/api/auth/panel/order/', {}, buyer)
+        return endpoints
+
+    def check_endpoint(self, name, path, params, user):
+        # A failing endpoint is reported with its status instead of stopping the run.
+        client = APIClient(raise_request_exception=False)
+        if user is not None:
+            client.force_authenticate(user)
+        collector = QueryCollector()
+        with connection.execute_wrapper(collector):
+            response = client.get(path, params)
+        self.stdout.write(f'{name} ({response.status_code}, {len(collector.queries)} distinct queries)')
+
+        flagged = 0
+        for sql, query_params in collector.queries.items():
+            plan, scanned = self.explain(sql, query_params)
+            if self.verbose:
+                self.stdout.write(f'  {sql}\n' + '\n'.join(f'    {line}' for line in plan))
+            for table in sorted(scanned):
+                rows = self.get_table_size(table)
+                if rows < self.min_rows:
+                    continue
+                flagged += 1
+                message = f'  Sequential scan on {table} ({rows} rows)'
+                self.stdout.write(self.style.WARNING(message if self.verbose else f'{message}: {sql[:300]}'))
+        return flagged
+
+    def explain(self, sql, params):
+        """Return the plan as text lines and the tables it reads with a sequential scan."""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scanned = set()
+                nodes = [plan[0]['Plan']]
+                while nodes:
+                    node = nodes.pop()
+                    if node['Node Type'] == 'Seq Scan':
+                        scanned.add(node['Relation Name'])
+                    nodes += node.get('Plans', [])
+                return json.dumps(plan, indent=2).splitlines(), scanned
+
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            details = [row[3] for row in cursor.fetchall()]
+        aliases = {alias: table for table, alias in SQLITE_ALIAS.findall(sql)}
+        tables = set(connection.introspection.table_names())
+        scanned = set()
+        for detail in details:
+            match = SQLITE_SCAN.match(detail)
+            if match:
+                table = aliases.get(match.group(1), match.group(1))
+                if table in tables:
+                    scanned.add(table)
+        return details, scanned
+
+    def get_table_size(self, table):
+        if table not in self.table_sizes:
+            with connection.cursor() as cursor:
+                rows = -1
+                if connection.vendor == 'postgresql':
+                    # The planner's estimate; -1 until the table is first analyzed.
+                    cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                    rows = cursor.fetchone()[0]
+                if rows < 0:
+                    cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                    rows = cursor.fetchone()[0]
+            self.table_sizes[table] = rows
+        return self.table_sizes[table]
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from product.models import CategoryClosure
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the category closure table from Category.parent (run once after deploying it).'
+
+    def handle(self, *args, **options):
+        count = CategoryClosure.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{count} closure rows written.'))
@@ -1,14 +1,45 @@
-from django.db import models
+import hashlib
+import os
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from accounts.models import CustomUserModel
+from django.conf import settings
 from django.utils.text import slugify
+from django.utils import timezone
+from response_cache import bump_version_on_commit
+from .storage import ContentAddressedStorage
 
 # Create your models here.
 
+class TouchQuerySet(models.QuerySet):
+    """
+    Bulk `update()` that also moves `updated_at` and bumps the response-cache
+    version named by `cache_version`, like `save()` and its receivers do.
+    `touch=False` skips both, for hot writes that must not flush the cache.
+    """
+    cache_version = None
+
+    def update(self, touch=True, **kwargs):
+        if not touch:
+            return super().update(**kwargs)
+        kwargs.setdefault('updated_at', timezone.now())
+        rows = super().update(**kwargs)
+        if rows and self.cache_version:
+            bump_version_on_commit(self.cache_version)
+        return rows
+
+
+class CategoryQuerySet(TouchQuerySet):
+    cache_version = 'category'
+
+
 class Category(models.Model):
     title = models.CharField(max_length=100,unique=True)
     slug = models.SlugField(max_length=100,unique = True,allow_unicode=True)
     parent = models.ForeignKey('self',on_delete=models.CASCADE,related_name='children',blank=True,null=True)
     is_active = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    objects = CategoryQuerySet.as_manager()
 
     def __str__(self):
         if self.parent:
@@ -19,20 +50,181 @@ class Category(models.Model):
 
         if not self.slug or self.slug != slugify(self.title,allow_unicode=True):
             self.slug = slugify(self.title, allow_unicode=True)
-        super().save(*args, **kwargs)
+
+        is_new = self._state.adding
+        old_parent_id = None
+        if not is_new:
+            old_parent_id = Category.objects.filter(pk=self.pk).values_list('parent_id', flat=True).first()
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                CategoryClosure.objects.insert_node(self)
+            elif old_parent_id != self.parent_id:
+                CategoryClosure.objects.move_subtree(self)
+                from .price_stats import invalidate_price_bounds
+                transaction.on_commit(invalidate_price_bounds)
+
+    def get_descendant_ids(self):
+        return CategoryClosure.objects.filter(ancestor=self).values_list('descendant_id', flat=True)
+
+
+class CategoryClosureManager(models.Manager):
+    def insert_node(self, category):
+        rows = [self.model(ancestor_id=category.id, descendant_id=category.id, depth=0)]
+        if category.parent_id:
+            parent_links = self.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth')
+            rows += [self.model(ancestor_id=ancestor_id, descendant_id=category.id, depth=depth + 1)
+                     for ancestor_id, depth in parent_links]
+        self.bulk_create(rows)
+
+    def move_subtree(self, category):
+        subtree = list(self.filter(ancestor_id=category.id).values_list('descendant_id', 'depth'))
+        subtree_ids = [descendant_id for descendant_id, depth in subtree]
+
+        self.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+
+        if category.parent_id:
+            parent_links = list(self.filter(descendant_id=category.parent_id).values_list('ancestor_id', 'depth'))
+            self.bulk_create([
+                self.model(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth + sub_depth + 1)
+                for ancestor_id, depth in parent_links
+                for descendant_id, sub_depth in subtree
+            ])
+
+    def rebuild(self):
+        parents = dict(Category.objects.values_list('id', 'parent_id'))
+        rows = []
+        for category_id in parents:
+            ancestor_id, depth = category_id, 0
+            while ancestor_id is not None:
+                rows.append(self.model(ancestor_id=ancestor_id, descendant_id=category_id, depth=depth))
+                ancestor_id, depth = parents.get(ancestor_id), depth + 1
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+class CategoryClosure(models.Model):
+    """
+    Ancestor/descendant pairs of the category tree, including the (self, self)
+    pair at depth 0. Maintained by `Category.save`.
+    """
+    ancestor = models.ForeignKey(Category,on_delete=models.CASCADE,related_name='descendant_links')
+    descendant = models.ForeignKey(Category,on_delete=models.CASCADE,related_name='ancestor_links')
+    depth = models.PositiveIntegerField()
+    objects = CategoryClosureManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor', 'descendant'], name='unique_category_closure'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant', 'depth'], name='category_closure_desc_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
 
 def get_product_image(self,filename):
-    return 'product/product_image'+ str(self.pk) +'/product_image.png'
+    digest = hashlib.sha256()
+    for chunk in self.image.file.chunks():
+        digest.update(chunk)
+    name = digest.hexdigest()
+    ext = os.path.splitext(filename)[1].lower() or '.png'
+    return f'product/images/{name[:2]}/{name}{ext}'
 def get_default_image():
     return 'product/default_image/default_product_image.png'
+def get_image_variant_name(image_name, variant):
+    return f'{os.path.splitext(image_name)[0]}_{variant}.jpg'
+
+PRICE_STATS_FIELDS = {'price', 'category', 'category_id', 'is_active', 'show_item'}
+
+
+def get_product_status(exist_number, current=None):
+    """Status a product gets on save: out of stock is 'unavailable' unless it is 'pending'."""
+    if exist_number == 0:
+        return 'pending' if current == 'pending' else 'unavailable'
+    return 'available'
+
+
+def get_product_status_update(exist_number):
+    """`get_product_status` for an UPDATE setting `exist_number` on many rows, keeping each row's 'pending'."""
+    if exist_number == 0:
+        return Case(When(status='pending', then=Value('pending')), default=Value('unavailable'))
+    return 'available'
+
+
+def get_product_status_from_stock():
+    """`get_product_status` for an UPDATE of many rows, from each row's own `exist_number` and `status`."""
+    return Case(
+        When(Q(exist_number=0) & Q(status='pending'), then=Value('pending')),
+        When(exist_number=0, then=Value('unavailable')),
+        default=Value('available'),
+    )
+
+
+class ProductQuerySet(TouchQuerySet):
+    cache_version = 'product'
+
+    def update(self, touch=True, **kwargs):
+        rows = super().update(touch=touch, **kwargs)
+        if rows and PRICE_STATS_FIELDS.intersection(kwargs):
+            from .price_stats import invalidate_price_bounds
+            transaction.on_commit(invalidate_price_bounds)
+        return rows
+
+    def delete(self):
+        result = super().delete()
+        from .price_stats import invalidate_price_bounds
+        transaction.on_commit(invalidate_price_bounds)
+        return result
+
+    def reserve_stock(self, deltas):
+        """
+        Move units between `exist_number` and carts with one conditional UPDATE.
+
+        `deltas` maps product id -> units; positive takes units out of stock,
+        negative gives them back. A row is only changed while
+        `exist_number >= units`, so concurrent checkouts cannot oversell.
+        All or nothing: returns False (and changes nothing) if any product
+        lacks stock. `status` follows the same rule as `Product.save`.
+
+        Stock moves on every cart change, so this leaves `updated_at` and the
+        'product' response-cache version alone: conditional GETs still see it
+        (the product ETag includes the stock), cached lists catch up on expiry.
+        """
+        deltas = {product_id: units for product_id, units in deltas.items() if units}
+        if not deltas:
+            return True
+        units = Case(*[When(pk=product_id, then=Value(amount)) for product_id, amount in deltas.items()],
+                     output_field=models.IntegerField())
+        with transaction.atomic():
+            rows = self.filter(pk__in=deltas, exist_number__gte=units).update(
+                touch=False,
+                exist_number=F('exist_number') - units,
+                status=Case(
+                    When(Q(exist_number=units) & Q(status='pending'), then=Value('pending')),
+                    When(exist_number=units, then=Value('unavailable')),
+                    default=Value('available'),
+                ),
+            )
+            if rows != len(deltas):
+                transaction.set_rollback(True)
+                return False
+        return True
+
 
 class Product(models.Model):
     title = models.CharField(max_length=150,unique=True)
     slug = models.SlugField(unique=True, blank=True,allow_unicode=True)
     description = models.TextField(blank=False,null=False)
     price = models.DecimalField(max_digits=14, decimal_places=2,blank=False,null=False)
-    category = models.ForeignKey(Category,on_delete=models.CASCADE,related_name='product')
-    image = models.ImageField(upload_to=get_product_image,default=get_default_image)
+    # Indexed by `product_category_new_idx`, which leads with it.
+    category = models.ForeignKey(Category,on_delete=models.CASCADE,related_name='product',db_index=False)
+    image = models.ImageField(upload_to=get_product_image,default=get_default_image,storage=ContentAddressedStorage())
+    image_variants_ready = models.BooleanField(default=False)
     exist_number = models.PositiveIntegerField(blank=False,null=False)
     STATUS_CHOICES = (
         ('available', 'Available'),
@@ -41,31 +233,92 @@ class Product(models.Model):
     )
     status = models.CharField(max_length=20,choices=STATUS_CHOICES,default='available')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     show_item = models.BooleanField(blank=False,null=False)
     is_active = models.BooleanField(default=True)
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        # Sort columns end with `id` because keyset pagination appends it.
+        indexes = [
+            # Public catalog: visible products by newest / by price, and the visible price bounds.
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_active=True, show_item=True), name='product_visible_new_idx'),
+            models.Index(fields=['price', 'id'], condition=Q(is_active=True, show_item=True), name='product_visible_price_idx'),
+            # Admin panel list (active products, newest first).
+            models.Index(fields=['-created_at', '-id'], condition=Q(is_active=True), name='product_active_new_idx'),
+            # Category pages: products of a category subtree, newest first.
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_new_idx'),
+        ]
 
     def __str__(self):
         return f'{self.title} - {self.category.title}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._price_state = instance.get_price_state()
+        instance._loaded_image = instance.__dict__.get('image')
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or 'image' in fields:
+            self._loaded_image = self.image.name
+
+    def image_changed(self):
+        return self.image.name != getattr(self, '_loaded_image', None)
+
+    def get_image_variants(self):
+        if not self.image_variants_ready:
+            return None
+        return {variant: self.image.storage.url(get_image_variant_name(self.image.name, variant))
+                for variant in settings.PRODUCT_IMAGE_SIZES}
+
+    def get_price_state(self):
+        fields = self.__dict__
+        if not {'price', 'category_id', 'is_active', 'show_item'}.issubset(fields):
+            return None
+        return (fields['price'], fields['category_id'], fields['is_active'], fields['show_item'])
+
 
     def save(self, *args, **kwargs):
 
         if not self.slug:
             self.slug = slugify(self.title, allow_unicode=True)
 
-        if self.exist_number == 0:
-            if self.status != 'pending':
-                self.status = 'unavailable'
-        else:
-            self.status = 'available'
+        self.status = get_product_status(self.exist_number, self.status)
+
+        if self.image_changed():
+            self.image_variants_ready = False
+
+        from .price_stats import invalidate_price_bounds
+        previous = None if self._state.adding else getattr(self, '_price_state', None)
         super().save(*args, **kwargs)
 
+        self._price_state = self.get_price_state()
+        if previous is None or previous != self._price_state:
+            transaction.on_commit(invalidate_price_bounds)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .price_stats import invalidate_price_bounds
+        transaction.on_commit(invalidate_price_bounds)
+        return result
+
 class ProductComment(models.Model):
-    product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='comments')
+    # Indexed by `comment_product_new_idx`, which leads with it.
+    product = models.ForeignKey(Product,on_delete=models.CASCADE,related_name='comments',db_index=False)
     author = models.ForeignKey(CustomUserModel,on_delete=models.CASCADE,related_name='comments')
     text_comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # A product's comments newest first, and the latest-comments window in the listings.
+            models.Index(fields=['product', '-created_at', '-id'], name='comment_product_new_idx'),
+        ]
+
     def __str__(self):
         return f"{self.author.email} - {self.text_comment[:30]}"
 
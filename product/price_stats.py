@@ -0,0 +1,61 @@
+"""
+Min/max price of the product lists, cached under a version counter.
+
+Any change that can move a bound (a save touching price, category,
+is_active or show_item, a bulk update of those fields, a delete or a
+category move) bumps the version once its transaction commits, so the next
+request recomputes the aggregate. Off while `PRICE_BOUNDS_TIMEOUT` is 0,
+the default unless the cache is shared between processes.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Max
+import cache_counters
+from .models import Product
+
+VERSION_KEY = 'product:price_bounds:version'
+
+# visible: what the public catalog shows, active: what the admin panel lists
+SCOPES = {
+    'visible': {'is_active': True, 'show_item': True},
+    'active': {'is_active': True},
+}
+
+
+def is_enabled():
+    return getattr(settings, 'PRICE_BOUNDS_TIMEOUT', 0) > 0
+
+
+def _make_key(scope, category_id, version):
+    return f'product:price_bounds:{version}:{scope}:{category_id or "all"}'
+
+
+def _compute_bounds(scope, category_id):
+    queryset = Product.objects.filter(**SCOPES[scope])
+    if category_id:
+        queryset = queryset.filter(category__ancestor_links__ancestor_id=category_id)
+    result = queryset.aggregate(min_price=Min('price'), max_price=Max('price'))
+    return result['min_price'], result['max_price']
+
+
+def get_price_bounds(scope='visible', category_id=None):
+    """
+    Return `(min_price, max_price)` of the products in `scope`, optionally
+    limited to a category and its children.
+    """
+    if not is_enabled():
+        bounds = _compute_bounds(scope, category_id)
+    else:
+        key = _make_key(scope, category_id, cache_counters.get_version(VERSION_KEY))
+        bounds = cache.get(key)
+        if bounds is None:
+            bounds = _compute_bounds(scope, category_id)
+            cache.set(key, bounds, settings.PRICE_BOUNDS_TIMEOUT)
+    min_price, max_price = bounds
+    return min_price or 0, max_price or 0
+
+
+def invalidate_price_bounds():
+    """Drop every cached bound; call once the change is committed."""
+    if is_enabled():
+        cache_counters.bump_version(VERSION_KEY)
@@ -0,0 +1,107 @@
+from django.db import connections
+from django.db.models import Q, Value, FloatField, BooleanField
+from django.db.models.expressions import RawSQL
+from .models import Product
+
+SEARCH_CONFIG = 'simple'
+
+
+def _table():
+    return Product._meta.db_table
+
+
+def _fts_table():
+    return f'{_table()}_fts'
+
+
+def install_search_index(sender=None, using='default', **kwargs):
+    """
+    Create the database side of product search (post_migrate hook).
+
+    PostgreSQL: a stored generated `search_vector` column (title weighted
+    above description) with a GIN index.
+    SQLite: an FTS5 table over title/description kept in sync by triggers.
+
+    Both are maintained by the database itself, so `save()`, bulk `update()`
+    and `bulk_create()` keep the index current.
+    """
+    connection = connections[using]
+    table = connection.ops.quote_name(_table())
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector "
+                f"GENERATED ALWAYS AS ("
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+                f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+                f") STORED"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {_table()}_search_vector_idx ON {table} USING GIN (search_vector)"
+            )
+        elif connection.vendor == 'sqlite':
+            fts = _fts_table()
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"title, description, content='{_table()}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                f"INSERT INTO {fts}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF title, description ON {table} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, title, description) VALUES ('delete', old.id, old.title, old.description); "
+                f"INSERT INTO {fts}(rowid, title, description) VALUES (new.id, new.title, new.description); END"
+            )
+            # Django rebuilds SQLite tables on some migrations, which drops the triggers.
+            cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def _fts_query(search):
+    terms = [term.replace('"', '""') for term in search.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def search_products(queryset, search):
+    """
+    Filter `queryset` to products matching `search` in title or description
+    and annotate `search_rank` (higher is more relevant).
+    """
+    search = search.strip()
+    if not search:
+        return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+    connection = connections[queryset.db]
+    vendor = connection.vendor
+    table = connection.ops.quote_name(_table())
+
+    if vendor == 'postgresql':
+        match = RawSQL(
+            f"{table}.search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)",
+            (search,), output_field=BooleanField(),
+        )
+        rank = RawSQL(
+            f"ts_rank({table}.search_vector, websearch_to_tsquery('{SEARCH_CONFIG}', %s))",
+            (search,), output_field=FloatField(),
+        )
+        return queryset.filter(match).annotate(search_rank=rank)
+
+    if vendor == 'sqlite':
+        fts = _fts_table()
+        query = _fts_query(search)
+        if not query:
+            return queryset.none()
+        matches = RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", (query,))
+        rank = RawSQL(
+            f"(SELECT -bm25({fts}, 10.0, 1.0) FROM {fts} WHERE {fts} MATCH %s AND rowid = {table}.id)",
+            (query,), output_field=FloatField(),
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+    queryset = queryset.filter(Q(title__icontains=search) | Q(description__icontains=search))
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -0,0 +1,163 @@
+"""
+Deterministic catalog data for benchmarks and staging (see the
+`seed_catalog` management command).
+
+Everything is written with chunked `bulk_create`, so `Product.save` /
+`Category.save` are bypassed: slugs and status are computed here the same
+way those methods compute them, and the category closure table is rebuilt
+once at the end. The same `seed` always produces the same rows.
+
+Each batch commits on its own, so a large run never holds one long
+transaction; a run that fails part way leaves the batches written so far.
+"""
+import random
+from decimal import Decimal
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils.text import slugify
+from accounts.models import CustomUserModel
+from batching import chunked
+from response_cache import bump_version
+from .models import Category, CategoryClosure, Product, ProductComment, get_product_status
+from .price_stats import invalidate_price_bounds
+
+WORDS = (
+    'space', 'rocket', 'orbit', 'lunar', 'solar', 'comet', 'nebula', 'galaxy', 'probe', 'module',
+    'telescope', 'satellite', 'capsule', 'engine', 'shuttle', 'station', 'helmet', 'suit', 'panel', 'kit',
+)
+SEED_PASSWORD = 'seed-password'
+# Share of seeded products with no stock.
+OUT_OF_STOCK_RATIO = 0.05
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+def seed_users(count, seed=0, batch_size=2000):
+    # One hash for every seeded user; hashing per row would dominate the run.
+    password = make_password(SEED_PASSWORD)
+    users = (CustomUserModel(email=f'seed{seed}-user{i}@example.com', password=password,
+                             first_name=f'User{i}') for i in range(count))
+    for chunk in chunked(users, batch_size):
+        CustomUserModel.objects.bulk_create(chunk)
+    return list(CustomUserModel.objects.filter(email__startswith=f'seed{seed}-user').order_by('id').values_list('id', flat=True))
+
+
+def seed_categories(depth, fanout, seed=0):
+    """A full tree `depth` levels deep with `fanout` children per node. Returns the category ids."""
+    level = [(None, '')]
+    ids = []
+    for _ in range(depth):
+        rows = []
+        for parent_id, path in level:
+            for i in range(1, fanout + 1):
+                title = f'Category {seed}-{path}{i}'
+                rows.append((parent_id, f'{path}{i}-', Category(title=title, slug=slugify(title, allow_unicode=True), parent_id=parent_id)))
+        Category.objects.bulk_create([category for _, _, category in rows])
+        slugs = {category.slug: path for _, path, category in rows}
+        created = Category.objects.filter(slug__in=slugs).order_by('id').values_list('id', 'slug')
+        level = [(category_id, slugs[slug]) for category_id, slug in created]
+        ids += [category_id for category_id, _ in level]
+    CategoryClosure.objects.rebuild()
+    return ids
+
+
+def seed_products(count, category_ids, seed=0, batch_size=2000):
+    rng = random.Random(f'products-{seed}')
+    for chunk in chunked(range(count), batch_size):
+        rows = []
+        for i in chunk:
+            title = f'{_sentence(rng, 2).title()} {seed}-{i}'
+            exist_number = 0 if rng.random() < OUT_OF_STOCK_RATIO else rng.randint(1, 500)
+            rows.append(Product(
+                title=title,
+                slug=slugify(title, allow_unicode=True),
+                description=_sentence(rng, 12),
+                price=Decimal(rng.randint(100, 500000)) / 100,
+                category_id=rng.choice(category_ids),
+                exist_number=exist_number,
+                status=get_product_status(exist_number),
+                show_item=rng.random() < 0.9,
+                is_active=rng.random() < 0.95,
+            ))
+        Product.objects.bulk_create(rows)
+        yield list(Product.objects.filter(slug__in=[row.slug for row in rows]).order_by('id').values_list('id', flat=True))
+
+
+def seed_comments(product_ids, per_product, user_ids, seed=0, batch_size=2000):
+    rng = random.Random(f'comments-{seed}-{product_ids[0] if product_ids else 0}')
+    comments = (ProductComment(product_id=product_id, author_id=rng.choice(user_ids), text_comment=_sentence(rng, 8))
+                for product_id in product_ids for _ in range(per_product))
+    total = 0
+    for chunk in chunked(comments, batch_size):
+        ProductComment.objects.bulk_create(chunk)
+        total += len(chunk)
+    return total
+
+
+def seed_orders(count, user_ids, seed=0, items_per_order=3, batch_size=2000):
+    """
+    Completed orders with their items and stored totals. Products are drawn
+    from a fixed sample of the catalog so memory does not grow with it.
+    """
+    from orders.models import Order, OrderItem
+
+    rng = random.Random(f'orders-{seed}')
+    products = list(Product.objects.order_by('id').values_list('id', 'price')[:10000])
+    if not products or not user_ids:
+        return 0, 0
+    items_total = 0
+    for chunk in chunked(range(count), batch_size):
+        orders, items = [], []
+        for i in chunk:
+            lines = [(product, rng.randint(1, 3)) for product in rng.sample(products, min(items_per_order, len(products)))]
+            orders.append(Order(
+                user_id=rng.choice(user_ids),
+                is_success=True,
+                tracking_code=f'seed{seed}-order{i}',
+                total_item=sum(quantity for _, quantity in lines),
+                total_price=sum(price * quantity for (_, price), quantity in lines),
+            ))
+            items.append(lines)
+        with transaction.atomic():
+            Order.objects.bulk_create(orders)
+            created = dict(Order.objects.filter(tracking_code__in=[order.tracking_code for order in orders])
+                           .values_list('tracking_code', 'id'))
+            rows = [OrderItem(order_id=created[order.tracking_code], product_id=product_id, unit_price=price, quantity=quantity)
+                    for order, lines in zip(orders, items) for (product_id, price), quantity in lines]
+            OrderItem.objects.bulk_create(rows, batch_size=batch_size)
+        items_total += len(rows)
+    return count, items_total
+
+
+def seed_catalog(products=10000, category_depth=3, category_fanout=4, comments_per_product=3, users=100,
+                 orders=0, seed=0, batch_size=2000, log=None):
+    """Seed users, a category tree, products, their comments and orders; returns the row counts."""
+    log = log or (lambda message: None)
+    counts = {}
+    try:
+        user_ids = seed_users(users, seed, batch_size)
+        counts['users'] = len(user_ids)
+        log(f'{counts["users"]} users')
+
+        # The tree and its closure rows go in together.
+        with transaction.atomic():
+            category_ids = seed_categories(category_depth, category_fanout, seed)
+        counts['categories'] = len(category_ids)
+        log(f'{counts["categories"]} categories')
+
+        counts['products'] = counts['comments'] = 0
+        for product_ids in seed_products(products, category_ids, seed, batch_size):
+            counts['products'] += len(product_ids)
+            if user_ids and comments_per_product:
+                counts['comments'] += seed_comments(product_ids, comments_per_product, user_ids, seed, batch_size)
+            log(f'{counts["products"]}/{products} products')
+
+        if orders:
+            counts['orders'], counts['order_items'] = seed_orders(orders, user_ids, seed, batch_size=batch_size)
+            log(f'{counts["orders"]} orders')
+    finally:
+        invalidate_price_bounds()
+        bump_version('product', 'category', 'comment')
+    return counts
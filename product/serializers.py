@@ -5,19 +5,42 @@ from .models import Product,Category,ProductComment
 class ProductCommentListSerializer(serializers.ModelSerializer):
     latest_comments = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
 
         model = Product
         fields = '__all__'
         extra_field = {'latest_comments','category'}
+        extra_kwargs = {
+            'image_variants_ready':{'read_only':True},
+        }
+
+    def __init__(self,*args,**kwargs):
+        super().__init__(*args,**kwargs)
+        # A `ProductFieldset` in the context trims the fields (see product/fieldsets.py).
+        fieldset = self.context.get('fieldset')
+        if fieldset is None or fieldset.is_default:
+            return
+        if not fieldset.expands('category'):
+            self.fields['category'] = serializers.PrimaryKeyRelatedField(read_only=True)
+        if not fieldset.expands('latest_comments'):
+            self.fields.pop('latest_comments')
+        for name in list(self.fields):
+            if not fieldset.includes(name):
+                self.fields.pop(name)
+
+    def get_image_variants(self,obj):
+        return obj.get_image_variants()
 
     def get_category(self,obj):
         category = obj.category
         return UserCategorySetSerializer(instance=category).data
 
     def get_latest_comments(self, obj):
-        comments = obj.comments.order_by('-created_at')[:3]
+        comments = getattr(obj, 'prefetched_latest_comments', None)
+        if comments is None:
+            comments = obj.comments.order_by('-created_at')[:3]
         if comments:
             return ProductCommentSerializer(instance=comments, many=True).data
         return None
@@ -45,6 +68,7 @@ class ProductSerializer(serializers.ModelSerializer):
             'image':{'required':False},
             'exist_number':{'required':False},
             'status':{'required':True},
+            'image_variants_ready':{'read_only':True},
         }
 
 class UserCategorySetSerializer(serializers.ModelSerializer):
@@ -66,7 +90,12 @@ class UserCategorySerializer(serializers.ModelSerializer):
         fields = ['id','title','slug','children']
 
     def get_children(self,obj):
-        children_q = Category.objects.filter(parent=obj)
+        # `load_category_tree` puts the whole tree in the context; without it each level is queried.
+        tree = self.context.get('category_children')
+        if tree is not None:
+            children_q = tree.get(obj.id, [])
+        else:
+            children_q = Category.objects.filter(parent=obj)
         return UserCategorySerializer(instance=children_q,many=True,context=self.context).data
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -76,3 +105,43 @@ class CategorySerializer(serializers.ModelSerializer):
         extra_kwargs = {'slug':{'read_only':True,},
                         'is_active':{'default':True}}
 
+    def validate_parent(self,value):
+        if value and self.instance and value.id in set(self.instance.get_descendant_ids()):
+            raise serializers.ValidationError('A category cannot be moved under itself or its children.')
+        return value
+
+
+class ProductImportSerializer(serializers.Serializer):
+    """
+    One row of a product import. Field checks only (no per-row queries);
+    `category` is a slug resolved through the `categories` map in the
+    context, and uniqueness is checked per chunk by the importer.
+    """
+    title = serializers.CharField(max_length=150)
+    slug = serializers.SlugField(max_length=50, required=False, allow_blank=True, allow_unicode=True)
+    description = serializers.CharField()
+    price = serializers.DecimalField(max_digits=14, decimal_places=2, min_value=0)
+    category = serializers.CharField()
+    exist_number = serializers.IntegerField(min_value=0)
+    show_item = serializers.BooleanField(default=True)
+    is_active = serializers.BooleanField(default=True)
+
+    def validate_category(self,value):
+        category_id = self.context['categories'].get(value)
+        if category_id is None:
+            raise serializers.ValidationError(f'Category "{value}" does not exist.')
+        return category_id
+
+
+class ProductBulkUpdateSerializer(serializers.Serializer):
+    """Fields an admin can set on many products at once; use with `partial=True` so only the given ones are written."""
+    price = serializers.DecimalField(max_digits=14, decimal_places=2, min_value=0)
+    category = serializers.SlugRelatedField(slug_field='slug', queryset=Category.objects.all())
+    exist_number = serializers.IntegerField(min_value=0)
+    show_item = serializers.BooleanField()
+    is_active = serializers.BooleanField()
+
+    def validate(self,attrs):
+        if not attrs:
+            raise serializers.ValidationError(f'Give at least one of: {", ".join(self.fields)}.')
+        return attrs
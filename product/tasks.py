@@ -0,0 +1,33 @@
+from celery import shared_task
+from django.conf import settings
+from PIL import Image, ImageOps
+from images import save_image_atomic
+from .models import Product, get_image_variant_name
+
+
+@shared_task
+def generate_product_image_derivatives(product_id, image_name):
+    """
+    Write the PRODUCT_IMAGE_SIZES variants (thumbnail/medium/large JPEGs,
+    fitted inside a square box) next to a content-addressed product image.
+    Variants of an image that was already processed are reused.
+    """
+    product = Product.objects.filter(pk=product_id, image=image_name).first()
+    if product is None:
+        return "Image changed or product removed, skipped"
+
+    storage = product.image.storage
+    missing = {variant: size for variant, size in settings.PRODUCT_IMAGE_SIZES.items()
+               if not storage.exists(get_image_variant_name(image_name, variant))}
+    if missing:
+        with storage.open(image_name) as source:
+            with Image.open(source) as original:
+                image = ImageOps.exif_transpose(original).convert("RGB")
+        for variant, size in missing.items():
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.Resampling.LANCZOS)
+            save_image_atomic(resized, storage.path(get_image_variant_name(image_name, variant)),
+                              format="JPEG", quality=80, optimize=True, progressive=True)
+
+    Product.objects.filter(pk=product_id, image=image_name).update(image_variants_ready=True)
+    return f"Image variants ready for product {product_id}"
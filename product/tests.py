@@ -1,3 +1,569 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import tempfile
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from PIL import Image
+from accounts.models import CustomUserModel
+from orders.models import Order
+from .models import Category, CategoryClosure, Product, ProductComment, get_image_variant_name
+from .importer import ProductImporter
+from .management.commands import benchmark_api
+from .price_stats import get_price_bounds
+from .tasks import generate_product_image_derivatives
+from .views import CategoryProductView, CategoryView, ProductViewSet
 
-# Create your tests here.
+
+def make_category_chain(depth, prefix='Level'):
+    parent = None
+    for i in range(depth):
+        parent = Category.objects.create(title=f'{prefix} {i}', parent=parent)
+    return parent
+
+
+def make_product(title, category, **kwargs):
+    kwargs.setdefault('price', 10)
+    kwargs.setdefault('exist_number', 5)
+    kwargs.setdefault('show_item', True)
+    return Product.objects.create(title=title, description='A product', category=category, **kwargs)
+
+
+class QueryCountMixin:
+    def get_counted(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        return response, queries.captured_queries
+
+    def assertWithinBudget(self, queries, budget):
+        sql = [query['sql'] for query in queries]
+        self.assertLessEqual(len(sql), budget, '\n'.join(sql))
+        self.assertEqual(len(sql), len(set(sql)), 'Repeated queries:\n' + '\n'.join(sql))
+
+
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        make_product('Timed', make_category_chain(1))
+
+    def test_off_by_default(self):
+        self.assertNotIn('Server-Timing', self.client.get('/api/product/'))
+
+    @override_settings(INSTRUMENTATION_SAMPLE_RATE=1)
+    def test_sampled_request_reports_queries_and_serializer_time(self):
+        with self.assertLogs('instrumentation', 'INFO') as logs:
+            response = self.client.get('/api/product/')
+        self.assertIn('serializer;dur=', response['Server-Timing'])
+        data = json.loads(logs.records[0].getMessage())
+        self.assertEqual((data['path'], data['query_budget']), ('/api/product/', ProductViewSet.query_budget['list']))
+        self.assertGreater(data['queries'], 0)
+        self.assertGreater(data['serializer_ms'], 0)
+
+
+class ProductDetailTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_of_product_in_deep_category_stays_within_budget(self):
+        product = make_product('Deep', make_category_chain(5))
+        author = CustomUserModel.objects.create_user('author@example.com', 'x')
+        for _ in range(4):
+            ProductComment.objects.create(product=product, author=author, text_comment='Nice')
+
+        response, queries = self.get_counted(f'/api/product/{product.slug}/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(queries, ProductViewSet.query_budget['retrieve'])
+        depth, category = 0, response.json()['category']
+        while category:
+            depth, category = depth + 1, category['parent']
+        self.assertEqual(depth, 5)
+        self.assertEqual(len(response.json()['latest_comments']), 3)
+
+    def test_detail_of_unknown_product_is_404(self):
+        self.assertEqual(self.client.get('/api/product/missing/').status_code, 404)
+
+
+class ProductListTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = CustomUserModel.objects.create_user('author@example.com', 'x')
+        self.root = make_category_chain(1, 'Root')
+
+    def add_products(self, count):
+        for i in range(count):
+            category = Category.objects.create(title=f'Branch {Product.objects.count()}', parent=self.root)
+            category = Category.objects.create(title=f'Leaf {Product.objects.count()}', parent=category)
+            product = make_product(f'Listed {Product.objects.count()}', category)
+            for _ in range(2):
+                ProductComment.objects.create(product=product, author=self.author, text_comment='Nice')
+
+    def assertConstantQueries(self, url, budget, params=None):
+        self.add_products(2)
+        response, few = self.get_counted(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.add_products(8)
+        cache.clear()
+        response, many = self.get_counted(url, params)
+        self.assertEqual(len(response.json()['results']), 10)
+        self.assertWithinBudget(many, budget)
+        self.assertEqual(len(few), len(many))
+
+    def test_product_list_queries_do_not_grow_with_the_page(self):
+        self.assertConstantQueries('/api/product/', ProductViewSet.query_budget['list'])
+
+    def test_product_keyset_page_queries_do_not_grow_with_the_page(self):
+        self.assertConstantQueries('/api/product/', ProductViewSet.query_budget['list'], {'cursor': ''})
+
+    def test_category_products_queries_do_not_grow_with_the_page(self):
+        self.assertConstantQueries(f'/api/category/{self.root.slug}/', CategoryProductView.query_budget)
+
+    def test_sparse_fieldset_skips_the_relations(self):
+        self.add_products(3)
+        response, queries = self.get_counted('/api/product/', {'fields': 'id,title'})
+        self.assertEqual(set(response.json()['results'][0]), {'id', 'title'})
+        response, expanded = self.get_counted('/api/product/')
+        self.assertLess(len(queries), len(expanded))
+
+
+class CategoryTreeTests(QueryCountMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_tree_is_read_in_constant_queries(self):
+        make_category_chain(5)
+        side = Category.objects.get(title='Level 1')
+        for i in range(3):
+            Category.objects.create(title=f'Side {i}', parent=side)
+
+        response, queries = self.get_counted('/api/category/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(queries, CategoryView.query_budget)
+        level_1 = response.json()[0]['children'][0]
+        self.assertEqual([child['title'] for child in level_1['children']], ['Level 2', 'Side 0', 'Side 1', 'Side 2'])
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = make_product('Cached', make_category_chain(1))
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_off_when_disabled(self):
+        self.assertNotIn('X-Cache', self.client.get('/api/product/'))
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_bulk_update_invalidates_after_commit(self):
+        self.assertEqual(self.client.get('/api/product/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/product/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            Product.objects.filter(pk=self.product.pk).update(exist_number=3)
+        self.assertEqual(self.client.get('/api/product/')['X-Cache'], 'HIT')
+
+        for callback in callbacks:
+            callback()
+        response = self.client.get('/api/product/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['results'][0]['exist_number'], 3)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_stock_reservation_keeps_the_cache(self):
+        self.client.get('/api/product/')
+        updated_at = self.product.updated_at
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertTrue(Product.objects.reserve_stock({self.product.id: 2}))
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self.client.get('/api/product/')['X-Cache'], 'HIT')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.exist_number, self.product.updated_at), (3, updated_at))
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_failed_reservation_keeps_the_cache(self):
+        self.client.get('/api/product/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(Product.objects.reserve_stock({self.product.id: 6}))
+        self.assertEqual(self.client.get('/api/product/')['X-Cache'], 'HIT')
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category_chain(1)
+        self.product = make_product('Tagged', self.category)
+        self.url = f'/api/product/{self.product.slug}/'
+
+    def get_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_unchanged_product_is_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(
+            self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+    def test_new_comment_changes_the_etag(self):
+        etag = self.get_etag()
+        author = CustomUserModel.objects.create_user('author@example.com', 'x')
+        ProductComment.objects.create(product=self.product, author=author, text_comment='Nice')
+        self.assertNotEqual(self.get_etag(), etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_category_soft_delete_changes_the_etag(self):
+        etag = self.get_etag()
+        Category.objects.filter(pk=self.category.pk).update(is_active=False)
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_stock_reservation_changes_the_etag(self):
+        etag = self.get_etag()
+        self.assertTrue(Product.objects.reserve_stock({self.product.id: 1}))
+        self.assertNotEqual(self.get_etag(), etag)
+
+
+class ImageDerivativeTests(APITestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+
+    def test_variants_are_written_next_to_the_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (1000, 500), 'red').save(buffer, format='PNG')
+        with self.settings(MEDIA_ROOT=self.media.name):
+            product = make_product('Pictured', make_category_chain(1),
+                                   image=SimpleUploadedFile('photo.png', buffer.getvalue(), 'image/png'))
+            generate_product_image_derivatives(product.id, product.image.name)
+
+        product.refresh_from_db()
+        self.assertTrue(product.image_variants_ready)
+        for variant, size in (('thumbnail', 150), ('large', 800)):
+            path = os.path.join(self.media.name, get_image_variant_name(product.image.name, variant))
+            with Image.open(path) as image:
+                self.assertEqual(image.size, (size, size // 2))
+        leftovers = [name for _, _, names in os.walk(self.media.name) for name in names if name.endswith('.tmp')]
+        self.assertEqual(leftovers, [])
+
+
+class ProductImportTests(APITestCase):
+    def setUp(self):
+        self.category = make_category_chain(1)
+
+    def run_import(self, *rows, batch_size=1000):
+        rows = [{'description': 'Imported', 'price': '9.50', 'category': self.category.slug, **row} for row in rows]
+        return ProductImporter(batch_size=batch_size).run(enumerate(rows, start=1))
+
+    def test_rows_are_upserted_on_slug(self):
+        make_product('Old title', self.category, slug='kept', price=1)
+
+        result = self.run_import({'title': 'New title', 'slug': 'kept', 'exist_number': 3},
+                                 {'title': 'Fresh', 'exist_number': 0}, batch_size=1)
+
+        self.assertEqual((result['created'], result['updated'], result['error_count']), (1, 1, 0))
+        kept = Product.objects.get(slug='kept')
+        self.assertEqual((kept.title, str(kept.price), kept.exist_number, kept.status), ('New title', '9.50', 3, 'available'))
+        self.assertEqual(Product.objects.get(slug='fresh').status, 'unavailable')
+
+    def test_reimport_keeps_pending_status(self):
+        make_product('Pending', self.category, exist_number=0, status='pending')
+        make_product('Sold out', self.category, exist_number=4)
+
+        self.run_import({'title': 'Pending', 'exist_number': 0}, {'title': 'Sold out', 'exist_number': 0})
+
+        self.assertEqual(Product.objects.get(title='Pending').status, 'pending')
+        self.assertEqual(Product.objects.get(title='Sold out').status, 'unavailable')
+
+    def test_bad_rows_are_reported_and_skipped(self):
+        result = self.run_import({'title': 'Good', 'exist_number': 1},
+                                 {'title': 'Bad', 'exist_number': -1},
+                                 {'title': 'Lost', 'exist_number': 1, 'category': 'missing'})
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [2, 3])
+        self.assertEqual(list(Product.objects.values_list('title', flat=True)), ['Good'])
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category_chain(1)
+
+    def search(self, term):
+        response = self.client.get('/api/product/', {'search': term})
+        self.assertEqual(response.status_code, 200)
+        return [product['title'] for product in response.json()['results']]
+
+    def test_matches_title_and_description(self):
+        make_product('Red kettle', self.category)
+        Product.objects.create(title='Teapot', description='Pairs with any kettle', category=self.category,
+                               price=10, exist_number=5, show_item=True)
+        make_product('Blue mug', self.category)
+
+        self.assertEqual(self.search('kettle'), ['Red kettle', 'Teapot'])
+        self.assertEqual(self.search('mu'), ['Blue mug'])
+
+    def test_index_follows_save_and_bulk_update(self):
+        product = make_product('Old name', self.category)
+        product.title = 'Renamed'
+        product.save()
+        self.assertEqual(self.search('renamed'), ['Renamed'])
+        self.assertEqual(self.search('old'), [])
+
+        Product.objects.filter(pk=product.pk).update(title='Bulk name')
+        self.assertEqual(self.search('bulk'), ['Bulk name'])
+        self.assertEqual(self.search('renamed'), [])
+
+    def test_quotes_and_operators_are_searched_literally(self):
+        make_product('Plain', self.category)
+        for term in ('"', 'kettle"', 'NOT AND OR', 'title:plain', 'a*b', '(plain', '-plain', 'NEAR(a b)'):
+            with self.subTest(term=term):
+                self.search(term)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        category = make_category_chain(1)
+        self.products = [make_product(f'Item {i}', category) for i in range(7)]
+        # One shared created_at, so pages are told apart by the id tiebreaker alone.
+        Product.objects.update(created_at=self.products[0].created_at)
+        self.expected = [product.id for product in reversed(self.products)]
+
+    def get_page(self, cursor='', **params):
+        response = self.client.get('/api/product/', {'cursor': cursor, 'offset': 3, **params})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [product['id'] for product in data['results']], data['next'], data['previous']
+
+    def test_pages_walk_forwards_and_backwards(self):
+        forward, pages, cursor = [], [], ''
+        while cursor is not None:
+            ids, cursor, previous = self.get_page(cursor)
+            pages.append((ids, previous))
+            forward += ids
+        self.assertEqual(forward, self.expected)
+        self.assertEqual([len(ids) for ids, _ in pages], [3, 3, 1])
+        self.assertIsNone(pages[0][1])
+
+        backward, cursor = [], pages[-1][1]
+        while cursor is not None:
+            ids, _, cursor = self.get_page(cursor)
+            backward = ids + backward
+        self.assertEqual(backward, self.expected[:6])
+
+    def test_pages_follow_the_price_sort(self):
+        for product, price in zip(self.products, (30, 10, 20, 10, 30, 20, 10)):
+            Product.objects.filter(pk=product.pk).update(price=price)
+        expected = [product.id for product in Product.objects.order_by('price', 'id')]
+
+        forward, cursor = [], ''
+        while cursor is not None:
+            ids, cursor, previous = self.get_page(cursor, sort='cheapest')
+            forward += ids
+        self.assertEqual(forward, expected)
+
+        ids, _, previous = self.get_page(previous, sort='cheapest')
+        self.assertEqual(ids, expected[3:6])
+        response = self.client.get('/api/product/', {'sort': 'expensive'})
+        self.assertEqual([product['price'] for product in response.json()['results']][:2], ['30.00', '30.00'])
+
+    def test_count_is_only_returned_on_request(self):
+        self.assertNotIn('count_item', self.client.get('/api/product/', {'cursor': ''}).json())
+        response = self.client.get('/api/product/', {'cursor': '', 'count': 'true'})
+        self.assertEqual(response.json()['count_item'], 7)
+
+    def test_invalid_cursor_is_400(self):
+        self.assertEqual(self.client.get('/api/product/', {'cursor': 'nonsense'}).status_code, 400)
+
+
+class CategoryClosureTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.leaf = make_category_chain(3, 'Tree')
+        self.middle = Category.objects.get(title='Tree 1')
+        self.other = Category.objects.create(title='Other')
+        make_product('In leaf', self.leaf)
+
+    def get_links(self):
+        return set(CategoryClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def assertClosureIsConsistent(self):
+        links = self.get_links()
+        CategoryClosure.objects.rebuild()
+        self.assertEqual(links, self.get_links())
+
+    def get_product_titles(self, category):
+        response = self.client.get(f'/api/category/{category.slug}/')
+        return [product['title'] for product in response.json()['results']]
+
+    def test_moving_a_subtree_moves_its_descendants(self):
+        self.middle.parent = self.other
+        self.middle.save()
+
+        self.assertClosureIsConsistent()
+        self.assertIn((self.other.id, self.leaf.id, 2), self.get_links())
+        self.assertEqual(self.get_product_titles(self.other), ['In leaf'])
+        self.assertEqual(self.get_product_titles(Category.objects.get(title='Tree 0')), [])
+
+    def test_moving_a_subtree_to_the_root(self):
+        self.middle.parent = None
+        self.middle.save()
+
+        self.assertClosureIsConsistent()
+        self.assertEqual(CategoryClosure.objects.filter(descendant=self.leaf).count(), 2)
+
+
+@override_settings(PRICE_BOUNDS_TIMEOUT=3600)
+class PriceBoundsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = make_category_chain(2)
+        self.parent = self.category.parent
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap = make_product('Cheap', self.category, price=5)
+            self.dear = make_product('Dear', self.category, price=50)
+
+    def assertBounds(self, low, high, category=None):
+        self.assertEqual(get_price_bounds('visible', category and category.id), (low, high))
+
+    def test_saving_a_product_widens_the_bounds(self):
+        self.assertBounds(5, 50, self.parent)
+        with self.captureOnCommitCallbacks(execute=True):
+            make_product('Dearer', self.category, price=80)
+        self.assertBounds(5, 80, self.parent)
+        self.assertBounds(5, 80)
+
+    def test_price_edit_narrows_the_bounds(self):
+        self.assertBounds(5, 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.dear.price = 20
+            self.dear.save()
+        self.assertBounds(5, 20)
+
+    def test_bulk_hiding_drops_the_product_from_the_bounds(self):
+        self.assertBounds(5, 50)
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.cheap.pk).update(is_active=False)
+        self.assertBounds(50, 50)
+        self.assertEqual(get_price_bounds('active'), (50, 50))
+
+    def test_bounds_are_not_moved_before_commit(self):
+        self.assertBounds(5, 50)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.dear.price = 20
+            self.dear.save()
+            self.assertBounds(5, 50)
+        for callback in callbacks:
+            callback()
+        self.assertBounds(5, 20)
+
+    def test_category_list_matches_its_bounds(self):
+        make_product('Hidden', self.category, price=1, show_item=False)
+        data = self.client.get(f'/api/category/{self.parent.slug}/').json()
+        self.assertEqual(sorted(product['title'] for product in data['results']), ['Cheap', 'Dear'])
+        self.assertEqual((data['min_price'], data['max_price']), (5, 50))
+
+
+class CheckQueryPlansTests(APITestCase):
+    def setUp(self):
+        category = make_category_chain(2)
+        product = make_product('Planned rocket', category)
+        CustomUserModel.objects.create_user('browser@example.com', 'x')
+        buyer = CustomUserModel.objects.create_user('buyer@example.com', 'x')
+        ProductComment.objects.create(product=product, author=buyer, text_comment='Nice')
+        Order.objects.create(user=buyer, is_success=True)
+
+    def run_command(self, **options):
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out, **options)
+        return out.getvalue()
+
+    def test_every_endpoint_is_checked(self):
+        output = self.run_command()
+        statuses = dict(re.findall(r'^(\w+) \((\d+), \d+ distinct queries\)$', output, re.M))
+        self.assertEqual(set(statuses), {
+            'product_list', 'product_list_cheapest', 'product_keyset', 'category_tree', 'admin_products',
+            'admin_users', 'admin_users_keyset', 'product_search', 'product_detail', 'product_comments',
+            'category_products', 'cart',
+        })
+        self.assertEqual(set(statuses.values()), {'200'})
+        self.assertIn('No sequential scans on large tables.', output)
+
+    def test_cart_is_skipped_without_orders(self):
+        Order.objects.all().delete()
+        self.assertNotIn('cart', self.run_command())
+
+    def test_small_threshold_flags_scans(self):
+        output = self.run_command(min_rows=0, endpoints='category_tree')
+        self.assertIn('Sequential scan on', output)
+
+
+class SeedCatalogTests(APITestCase):
+    def seed(self, **options):
+        out = io.StringIO()
+        call_command('seed_catalog', products=40, category_depth=2, category_fanout=2, comments=1, users=3,
+                     orders=2, batch_size=15, stdout=out, **options)
+        return out.getvalue()
+
+    def test_seeds_every_table_in_batches(self):
+        output = self.seed()
+
+        self.assertIn('Seeded 3 users, 6 categories, 40 products, 40 comments, 2 orders, 6 order_items', output)
+        self.assertIn('30/40 products', output)
+        self.assertEqual(CategoryClosure.objects.count(), 6 + 4)
+        self.assertEqual(Order.objects.filter(is_success=True).count(), 2)
+        out_of_stock = Product.objects.filter(exist_number=0)
+        self.assertLess(out_of_stock.count(), 10)
+        self.assertFalse(out_of_stock.exclude(status='unavailable').exists())
+
+    def test_same_seed_is_refused_and_repeatable(self):
+        self.seed()
+        first = list(Product.objects.order_by('id').values_list('title', 'price', 'exist_number'))
+        with self.assertRaises(CommandError):
+            self.seed()
+
+        Category.objects.all().delete()
+        CustomUserModel.objects.all().delete()
+        self.seed()
+        self.assertEqual(list(Product.objects.order_by('id').values_list('title', 'price', 'exist_number')), first)
+
+
+class BenchmarkApiTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.command = benchmark_api.Command(stdout=io.StringIO())
+        self.options = {'products': 30, 'category_depth': 2, 'category_fanout': 2, 'comments': 1, 'users': 2,
+                        'seed': 0, 'warmup': 1, 'requests': 4, 'response_cache': False}
+
+    def test_percentile(self):
+        self.assertEqual(benchmark_api.percentile([7.0], 95), 7.0)
+        self.assertEqual(benchmark_api.percentile([float(i) for i in range(1, 102)], 50), 51.0)
+
+    def test_scenarios_run_without_errors(self):
+        dataset = self.command.prepare_dataset(self.options)
+        self.assertEqual(dataset['products'], 30)
+        for name in ('product_list', 'product_search', 'product_keyset', 'category_products', 'cart_add', 'cart_bulk'):
+            with self.subTest(name=name):
+                result = self.command.run_scenario(name, self.options)
+                self.assertEqual((result['requests'], result['errors']), (4, 0))
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+
+    def test_comparison_flags_slower_scenarios(self):
+        previous = {'meta': {'commit': 'abc123'}, 'scenarios': {'product_list': {'p95_ms': 10.0, 'queries_mean': 5}}}
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as previous_file:
+            json.dump(previous, previous_file)
+            previous_file.flush()
+            report = {'scenarios': {'product_list': {'p95_ms': 15.0, 'queries_mean': 5},
+                                    'product_search': {'p95_ms': 3.0, 'queries_mean': 2}}}
+            self.command.print_comparison(report, previous_file.name)
+        output = self.command.stdout.getvalue()
+        self.assertIn('Compared with abc123', output)
+        self.assertIn('product_list         p95 10.0 -> 15.0 ms (+50%), queries 5 -> 5', output)
+        self.assertNotIn('product_search', output)
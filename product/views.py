@@ -3,12 +3,19 @@ from rest_framework import viewsets,status,views
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from permissions import IsOwnerOrReadOnly
+from pagination import KeysetPagination
+from response_cache import cache_anonymous_response
 from .models import Product,ProductComment,Category
 from .serializers import ProductCommentListSerializer,CommentSerializer,UserCategorySerializer
+from .loaders import load_category_tree,load_product_listing
+from .fieldsets import ProductFieldset
+from .price_stats import get_price_bounds
+from .search import search_products
+from .etags import category_tree_etag,category_tree_last_modified,product_etag,product_last_modified
 from django.core.paginator import Paginator
-from django.db.models import Q
-from django.db.models import Min, Max
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 
 # Create your views here.
 
@@ -20,12 +27,16 @@ class ProductViewSet(viewsets.ModelViewSet):
         - GET (list): Get a list of products with optional search, price filter, and sorting
 
     Query Parameters (GET):
-        - search: Filter by title or description
+        - search: Full-text search in title and description (ranked by relevance unless `sort` is given)
         - sort: newest, oldest, cheapest, expensive
         - min_price: Minimum price
         - max_price: Maximum price
         - page: Page number
         - offset: Number of items per page
+        - cursor: Opt-in keyset pagination (empty for the first page, then `next`/`previous`)
+        - count: With `cursor`, also return `count_item` (true/false)
+        - fields: Comma-separated product fields to return (default: all)
+        - expand: Nested relations to include: category, latest_comments (default: all when `fields` is not given either)
 
     Filters Applied:
         - show_item: True
@@ -41,13 +52,24 @@ class ProductViewSet(viewsets.ModelViewSet):
     http_method_names = ['get']
     lookup_field = 'slug'
     metadata_class = None
+    query_budget = {'list': 8, 'retrieve': 4}
 
+    @method_decorator(condition(etag_func=product_etag, last_modified_func=product_last_modified))
+    @cache_anonymous_response('product', 'category', 'comment')
+    def retrieve(self, request, slug=None):
+        product = get_object_or_404(self.queryset.select_related('category'), slug=slug)
+        # Same batched category chain and comments as the list, whatever the category depth.
+        ser_product = ProductCommentListSerializer(instance=load_product_listing([product])[0])
+        return Response(ser_product.data, status=status.HTTP_200_OK)
+
+    @cache_anonymous_response('product', 'category', 'comment')
     def list(self,request):
-        queryset = self.queryset
+        fieldset = ProductFieldset.from_request(request)
+        queryset = fieldset.apply(self.queryset)
 
         search = request.query_params.get('search','')
         if search:
-            queryset = queryset.filter(Q(title__icontains=search) or Q(description__icontains=search))
+            queryset = search_products(queryset, search)
 
         sort = request.query_params.get('sort', 'newest')
         if sort == 'newest':
@@ -62,20 +84,23 @@ class ProductViewSet(viewsets.ModelViewSet):
             queryset = queryset.order_by('-created_at')
 
         min_price = request.query_params.get('min_price')
+        max_price = request.query_params.get('max_price')
+        if min_price is None or max_price is None:
+            price_bounds = get_price_bounds('visible')
+
         if min_price is None:
-            min_price = Product.objects.aggregate(Min('price'))['price__min'] or 0
+            min_price = price_bounds[0]
         else:
             min_price = float(min_price)
 
-        max_price = request.query_params.get('max_price')
         if max_price is None:
-            max_price = Product.objects.aggregate(Max('price'))['price__max'] or 0
+            max_price = price_bounds[1]
         else:
             max_price = float(max_price)
 
         queryset = queryset.filter(price__gte=min_price, price__lte=max_price)
 
-        queryset = queryset.filter(Q(show_item=True) and Q(is_active=True))
+        queryset = queryset.filter(show_item=True, is_active=True)
 
         try:
             page_num = int(request.query_params.get('page', 1))
@@ -83,20 +108,24 @@ class ProductViewSet(viewsets.ModelViewSet):
         except:
             return Response({"detail": "please right write offset or page"},status=status.HTTP_400_BAD_REQUEST)
 
-        sort = request.query_params.get('sort','')
-        if sort == '-created_at' or sort:
-            queryset = queryset.order_by('-created_at')
-        if sort == 'created_at':
-            queryset = queryset.order_by('created_at')
-        else:
-            queryset = queryset.order_by('-created_at')
-
+        if search and 'sort' not in request.query_params:
+            queryset = queryset.order_by('-search_rank')
 
         if page_offset < 1:
             page_offset = 1
         elif page_offset > 100:
             page_offset = 100
 
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_offset)
+            products = load_product_listing(keyset.paginate_queryset(queryset, request), fieldset)
+            ser_product = ProductCommentListSerializer(instance=products, many=True, context={'fieldset': fieldset})
+            return Response({
+                **keyset.get_paginated_data(ser_product.data),
+                "max_price": max_price,
+                "min_price": min_price,
+            }, status=status.HTTP_200_OK)
+
         paginator = Paginator(queryset, page_offset)
 
         if page_num < 1:
@@ -105,7 +134,7 @@ class ProductViewSet(viewsets.ModelViewSet):
             page_num = paginator.num_pages
         page = paginator.page(page_num)
 
-        ser_product = ProductCommentListSerializer(instance=page, many=True)
+        ser_product = ProductCommentListSerializer(instance=load_product_listing(page.object_list, fieldset), many=True, context={'fieldset': fieldset})
         return Response({
             "count_item": paginator.count,
             "count_page": paginator.num_pages,
@@ -125,6 +154,8 @@ class CommentViewsSet(viewsets.ViewSet):
     Query Parameters (GET):
         - page: Page number
         - offset: Number of items per page
+        - cursor: Opt-in keyset pagination (empty for the first page, then `next`/`previous`)
+        - count: With `cursor`, also return `count_item` (true/false)
 
     Responses:
         - ✅ 200: Successfully retrieved comments with pagination info
@@ -158,7 +189,12 @@ class CommentViewsSet(viewsets.ViewSet):
         elif page_offset > 100:
             page_offset = 100
 
-        paginator = Paginator(product, page_offset)
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_offset)
+            ser_comment = CommentSerializer(instance=keyset.paginate_queryset(comments, request), many=True)
+            return Response(keyset.get_paginated_data(ser_comment.data), status=status.HTTP_200_OK)
+
+        paginator = Paginator(comments, page_offset)
 
         if page_num < 1:
             page_num = 1
@@ -189,29 +225,27 @@ class CommentViewsSet(viewsets.ViewSet):
 class CategoryView(views.APIView):
     permission_classes = [AllowAny]
     serializer_class = UserCategorySerializer
+    query_budget = 3
+
+    @method_decorator(condition(etag_func=category_tree_etag, last_modified_func=category_tree_last_modified))
+    @cache_anonymous_response('category')
     def get(self,request):
-        category = Category.objects.filter(parent__isnull=True)
-        ser_cat = UserCategorySerializer(instance=category,many=True)
+        category, children = load_category_tree(Category.objects.filter(parent__isnull=True))
+        ser_cat = UserCategorySerializer(instance=category,many=True,context={'category_children': children})
         return Response(ser_cat.data,status=status.HTTP_200_OK)
 
 class CategoryProductView(views.APIView):
     permission_classes = [AllowAny]
     serializer_class = ProductCommentListSerializer
+    query_budget = 8
 
+    @cache_anonymous_response('product', 'category', 'comment')
     def get(self, request, slug):
+        fieldset = ProductFieldset.from_request(request)
         category = get_object_or_404(Category, slug=slug)
-
-        def get_cat_ids(cat):
-            ids = []
-            queue = [cat]
-            while queue:
-                current = queue.pop(0)
-                ids.append(current.id)
-                queue.extend(current.children.all())
-            return ids
-
-        cat_id = get_cat_ids(category)
-        product = Product.objects.filter(category_id__in=cat_id)
+        # Same rows as the 'visible' price bounds below.
+        product = fieldset.apply(Product.objects.filter(category__ancestor_links__ancestor=category, show_item=True, is_active=True))
+        min_price, max_price = get_price_bounds('visible', category.id)
 
         try:
             page_num = int(request.query_params.get('page', 1))
@@ -232,6 +266,16 @@ class CategoryProductView(views.APIView):
         elif page_offset > 100:
             page_offset = 100
 
+        if KeysetPagination.is_requested(request):
+            keyset = KeysetPagination(page_offset)
+            products = load_product_listing(keyset.paginate_queryset(product, request), fieldset)
+            ser_pro = ProductCommentListSerializer(instance=products, many=True, context={'fieldset': fieldset})
+            return Response({
+                **keyset.get_paginated_data(ser_pro.data),
+                "max_price": max_price,
+                "min_price": min_price,
+            }, status=status.HTTP_200_OK)
+
         paginator = Paginator(product, page_offset)
 
         if page_num < 1:
@@ -240,12 +284,14 @@ class CategoryProductView(views.APIView):
             page_num = paginator.num_pages
         page = paginator.page(page_num)
 
-        ser_pro = ProductCommentListSerializer(instance=page.object_list, many=True)
+        ser_pro = ProductCommentListSerializer(instance=load_product_listing(page.object_list, fieldset), many=True, context={'fieldset': fieldset})
         return Response({
             "count_item": paginator.count,
             "count_page": paginator.num_pages,
             "current_page": page_num,
-            "results": ser_pro.data
+            "results": ser_pro.data,
+            "max_price": max_price,
+            "min_price": min_price,
         }, status=status.HTTP_200_OK)
 
 
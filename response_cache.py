@@ -0,0 +1,92 @@
+import hashlib
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+import cache_counters
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'response_cache:version:{}'
+STATS_KEY = 'response_cache:{}:{}'
+
+
+def is_enabled():
+    return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 0) > 0
+
+
+def get_version(name):
+    return cache_counters.get_version(VERSION_KEY.format(name))
+
+
+def get_versions(names):
+    keys = {VERSION_KEY.format(name): name for name in names}
+    found = cache.get_many(list(keys))
+    return [(name, found.get(key) or get_version(name)) for key, name in keys.items()]
+
+
+def bump_version(*names):
+    """Invalidate every cached response that depends on one of `names`."""
+    for name in names:
+        cache_counters.bump_version(VERSION_KEY.format(name))
+
+
+def bump_version_on_commit(*names):
+    """`bump_version()` once the current transaction commits, so no response is cached from the old rows under the new version."""
+    if is_enabled():
+        transaction.on_commit(lambda: bump_version(*names))
+
+
+def get_stats(view_name):
+    return {
+        'hits': cache.get(STATS_KEY.format('hit', view_name), 0),
+        'misses': cache.get(STATS_KEY.format('miss', view_name), 0),
+    }
+
+
+def make_key(view_name, request, depends_on, kwargs):
+    params = sorted((key, value) for key in request.query_params for value in request.query_params.getlist(key))
+    versions = get_versions(depends_on)
+    raw = repr((view_name, sorted(kwargs.items()), params, versions))
+    return 'response_cache:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+def cache_anonymous_response(*depends_on, timeout=None):
+    """
+    Cache the data of successful GET responses for anonymous users.
+
+    The key is built from the normalized query parameters, the URL kwargs
+    and the current version of every name in `depends_on` (e.g. 'product',
+    'category'). Bumping one of those versions makes all older entries
+    unreachable, so nothing stale is served after an edit. Off while
+    `RESPONSE_CACHE_TIMEOUT` is 0, the default unless the cache is shared.
+    """
+    def decorator(method):
+        view_name = method.__qualname__
+
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated or not is_enabled():
+                return method(self, request, *args, **kwargs)
+
+            key = make_key(view_name, request, depends_on, kwargs)
+            cached = cache.get(key)
+            if cached is not None:
+                cache_counters.increment(STATS_KEY.format('hit', view_name))
+                logger.debug('response cache hit: %s', view_name)
+                response = Response(cached['data'], status=cached['status'])
+                response['X-Cache'] = 'HIT'
+                return response
+
+            cache_counters.increment(STATS_KEY.format('miss', view_name))
+            logger.debug('response cache miss: %s', view_name)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, {'data': response.data, 'status': response.status_code},
+                          timeout or settings.RESPONSE_CACHE_TIMEOUT)
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
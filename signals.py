@@ -1,29 +1,46 @@
-import os
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from PIL import Image
 from accounts.models import CustomUserModel
+from accounts.tasks import process_avatar
+from accounts.user_cache import invalidate_users_on_commit
+from product.models import Product, Category, ProductComment, get_default_image
+from product.tasks import generate_product_image_derivatives
+from response_cache import bump_version_on_commit
 
 @receiver(post_save, sender=CustomUserModel)
-def resize_and_rename_profile_photo(sender, instance, **kwargs):
-    if instance.avatar:
-        try:
-            old_path = instance.avatar.path
-            ext = os.path.splitext(old_path)[1]
-            new_filename = "avatar.jpg"
-            new_path = os.path.join(os.path.dirname(old_path), new_filename)
-
-            if old_path != new_path:
-                if os.path.exists(new_path):
-                    os.remove(new_path)
-                os.rename(old_path, new_path)
-                instance.avatar.name = os.path.join(os.path.dirname(instance.avatar.name), new_filename)
-                instance.save(update_fields=['avatar'])
-
-            img = Image.open(new_path)
-            img = img.convert("RGB")
-            img = img.resize((400, 400), Image.Resampling.LANCZOS)
-            img.save(new_path, format="JPEG", quality=75, optimize=True)
-
-        except Exception as e:
-            print("Error resizing or renaming image:", e)
+def process_profile_photo(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'avatar' not in update_fields:
+        return
+    if instance.avatar and instance.avatar_changed():
+        user_id, avatar_name = instance.pk, instance.avatar.name
+        transaction.on_commit(lambda: process_avatar.delay(user_id, avatar_name))
+    instance._loaded_avatar = instance.avatar.name
+
+
+@receiver([post_save, post_delete], sender=CustomUserModel)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_users_on_commit(instance.pk)
+
+
+@receiver(post_save, sender=Product)
+def process_product_image(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and instance.image_changed() and instance.image.name != get_default_image():
+        product_id, image_name = instance.pk, instance.image.name
+        transaction.on_commit(lambda: generate_product_image_derivatives.delay(product_id, image_name))
+    instance._loaded_image = instance.image.name
+
+
+@receiver([post_save, post_delete], sender=Product)
+def bump_product_version(sender, instance, **kwargs):
+    bump_version_on_commit('product')
+
+@receiver([post_save, post_delete], sender=Category)
+def bump_category_version(sender, instance, **kwargs):
+    bump_version_on_commit('category')
+
+@receiver([post_save, post_delete], sender=ProductComment)
+def bump_comment_version(sender, instance, **kwargs):
+    bump_version_on_commit('comment')
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import time
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+import cache_counters
+
+logger = logging.getLogger(__name__)
+
+WINDOW_KEY = 'throttle:{}:{}:{}:{}'
+STATS_KEY = 'throttle:stats:{}:{}'
+
+
+def get_stats(scope):
+    """Allowed/throttled request counters of a throttle scope, per bucket."""
+    buckets = SlidingWindowThrottle.buckets
+    found = cache.get_many([STATS_KEY.format(scope, 'allowed')] + [STATS_KEY.format(scope, bucket) for bucket in buckets])
+    return {
+        'allowed': found.get(STATS_KEY.format(scope, 'allowed'), 0),
+        'throttled': {bucket: found.get(STATS_KEY.format(scope, bucket), 0) for bucket in buckets},
+    }
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    Limit a view per client IP, per submitted email and globally.
+
+    The view names its `throttle_scope`; every bucket reads its rate from
+    `DEFAULT_THROTTLE_RATES['<scope>.<bucket>']` (e.g. `send_code.ip`), and a
+    bucket without a rate is not enforced. Each bucket is a sliding window
+    counter (current + weighted previous fixed window) kept in the cache, so
+    a check costs one `get_many` and one `incr` per bucket.
+
+    DRF runs throttles before the view body, so rejected requests never
+    reach password hashing, and it answers them with 429 + `Retry-After`.
+    """
+    buckets = ('global', 'ip', 'email')
+
+    def get_bucket_ident(self, bucket, request):
+        if bucket == 'global':
+            return 'all'
+        if bucket == 'ip':
+            return self.get_ident(request)
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        if not email or not isinstance(email, str):
+            return None
+        return hashlib.md5(email.strip().lower().encode()).hexdigest()
+
+    def get_rates(self, scope):
+        rates = api_settings.DEFAULT_THROTTLE_RATES or {}
+        for bucket in self.buckets:
+            rate = rates.get(f'{scope}.{bucket}')
+            if rate:
+                yield bucket, self.parse_rate(rate)
+
+    def parse_rate(self, rate):
+        num, period = rate.split('/')
+        duration = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+        if int(num) <= 0:
+            # Leave the rate out to disable a bucket; a rate of 0 would lock everyone out.
+            raise ImproperlyConfigured(f'Throttle rate {rate!r} must allow at least one request')
+        return int(num), duration
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return True
+        self.wait_seconds = None
+        now = time.time()
+
+        taken = []
+        for bucket, (num, duration) in self.get_rates(scope):
+            ident = self.get_bucket_ident(bucket, request)
+            if ident is None:
+                continue
+            window, elapsed = divmod(now, duration)
+            key = WINDOW_KEY.format(scope, bucket, ident, int(window))
+            previous_key = WINDOW_KEY.format(scope, bucket, ident, int(window) - 1)
+            # Take the slot first so concurrent requests cannot all squeeze in.
+            cache.add(key, 0, duration * 2)
+            try:
+                current = cache.incr(key)
+            except ValueError:
+                cache.set(key, 1, duration * 2)
+                current = 1
+            taken.append(key)
+            previous = cache.get(previous_key, 0)
+            if previous * (1 - elapsed / duration) + current > num:
+                for slot in taken:
+                    try:
+                        cache.decr(slot)
+                    except ValueError:
+                        pass
+                self.wait_seconds = self.get_wait(num, duration, elapsed, previous, current - 1)
+                cache_counters.increment(STATS_KEY.format(scope, bucket))
+                logger.warning('throttled %s by %s bucket', scope, bucket)
+                return False
+        cache_counters.increment(STATS_KEY.format(scope, 'allowed'))
+        return True
+
+    def get_wait(self, num, duration, elapsed, previous, current):
+        """Seconds until the weighted count leaves room for one more request."""
+        if current >= num:
+            # The next window starts with `current` as its previous count.
+            return duration - elapsed + duration * (1 - (num - 1) / current)
+        return max(duration * (1 - (num - 1 - current) / previous) - elapsed, 1)
+
+    def wait(self):
+        return self.wait_seconds